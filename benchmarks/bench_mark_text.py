@@ -0,0 +1,242 @@
+"""Benchmarks for the /mark rendering pipeline.
+
+Runs the recorded MarkAccent response in ``fixtures/`` through each stage
+(parsing, layout, raster, encoding and SVG output) at several text sizes and
+reports wall time, peak traced memory and output bytes per stage.
+
+    uv run python -m benchmarks.bench_mark_text
+    uv run python -m benchmarks.bench_mark_text --save baseline.json
+    uv run python -m benchmarks.bench_mark_text --baseline baseline.json
+
+With ``--baseline`` the run fails when a stage got slower, used more memory
+or produced more bytes than the baseline by more than ``--threshold``.
+Peak memory comes from tracemalloc, so it only covers Python allocations and
+not Pillow's pixel buffers.
+"""
+
+import argparse
+import json
+import statistics
+import sys
+import time
+import tracemalloc
+from collections.abc import Callable
+from pathlib import Path
+from typing import Any, NamedTuple
+
+from PIL import ImageChops
+
+import utils.mark_render as mark_render
+from cogs.mark_text import parse_mark_accent
+from utils.font_registry import FONT_REGISTRY
+from utils.image_encoding import FILE_EXTENSIONS, encode_image
+from utils.mark_layout import MAX_WORD_PER_LINE, MarkLayout, layout_tokens
+from utils.mark_render import PillowMetrics, rasterize
+
+FIXTURE = Path(__file__).parent / "fixtures" / "mark_accent_response.json"
+
+# How many times the fixture is repeated for the multi-paragraph case
+PARAGRAPH_REPEAT = 12
+# Timing differences below this are noise, even when the ratio is large
+MIN_MS_REGRESSION = 0.1
+
+
+class StageResult(NamedTuple):
+    ms: float  # median wall time
+    peak_kib: float  # tracemalloc peak of a single run
+    bytes: int  # size of the stage output
+
+
+def _layout_bytes(layout: MarkLayout) -> int:
+    arrays = (
+        layout.surface_xy,
+        layout.furigana_xy,
+        layout.furigana_boxes,
+        layout.kanji_boxes,
+        *layout.accents,
+    )
+    texts = (*layout.surfaces, *layout.furigana)
+    return sum(a.itemsize * len(a) for a in arrays) + sum(
+        len(t.encode()) for t in texts
+    )
+
+
+def measure(
+    fn: Callable[[], Any], size: Callable[[Any], int], repeat: int
+) -> StageResult:
+    # One warm-up run fills the font registry and glyph atlas
+    output = fn()
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return StageResult(statistics.median(times) * 1000, peak / 1024, size(output))
+
+
+def load_cases() -> dict[str, list[dict[str, Any]]]:
+    """Raw MarkAccent result items for each benchmark size"""
+    items: list[dict[str, Any]] = json.loads(FIXTURE.read_text(encoding="utf-8"))[
+        "result"
+    ]
+    line: list[dict[str, Any]] = []
+    char_cnt = 0
+    for item in items:
+        if char_cnt + len(item["surface"]) > MAX_WORD_PER_LINE:
+            break
+        line.append(item)
+        char_cnt += len(item["surface"])
+    return {
+        "short": items[:4],
+        "line": line,
+        "paragraphs": items * PARAGRAPH_REPEAT,
+    }
+
+
+def run_case(
+    items: list[dict[str, Any]], repeat: int, draw_box: bool
+) -> tuple[dict[str, StageResult], bool]:
+    """Benchmark every stage, and check the glyph atlas draws the same pixels"""
+    metrics = PillowMetrics(
+        FONT_REGISTRY.get(mark_render.FONT_PATH, mark_render.BASE_FONT_SIZE)
+    )
+    tokens = parse_mark_accent(items)
+    layout = layout_tokens(tokens, metrics, draw_box=draw_box)
+    img = rasterize(layout)
+
+    results = {
+        "parse": measure(
+            lambda: parse_mark_accent(items),
+            lambda out: len(json.dumps(out, ensure_ascii=False).encode()),
+            repeat,
+        ),
+        "layout": measure(
+            lambda: layout_tokens(tokens, metrics, draw_box=draw_box),
+            _layout_bytes,
+            repeat,
+        ),
+        "raster": measure(
+            lambda: rasterize(layout, use_atlas=True),
+            lambda out: len(out.tobytes()),
+            repeat,
+        ),
+        "raster_direct": measure(
+            lambda: rasterize(layout, use_atlas=False),
+            lambda out: len(out.tobytes()),
+            repeat,
+        ),
+    }
+    for encoding in FILE_EXTENSIONS:
+        if encoding == "svg":
+            continue
+        results[f"encode_{encoding}"] = measure(
+            lambda: encode_image(img, encoding),
+            lambda out: out.getbuffer().nbytes,
+            repeat,
+        )
+    # SVG starts from the layout, so it replaces both raster and encoding
+    results["svg"] = measure(
+        lambda: mark_render.generate_image(tokens, draw_box, encoding="svg"),
+        lambda out: out.getbuffer().nbytes,
+        repeat,
+    )
+    results["total"] = measure(
+        lambda: mark_render.generate_image(tokens, draw_box),
+        lambda out: out.getbuffer().nbytes,
+        repeat,
+    )
+
+    direct = rasterize(layout, use_atlas=False)
+    identical = ImageChops.difference(img, direct).getbbox() is None
+    return results, identical
+
+
+def format_results(results: dict[str, dict[str, StageResult]]) -> str:
+    lines = [f"{'case':<12}{'stage':<16}{'ms':>9}{'peak KiB':>10}{'bytes':>11}"]
+    for case, stages in results.items():
+        for stage, r in stages.items():
+            lines.append(
+                f"{case:<12}{stage:<16}{r.ms:>9.2f}{r.peak_kib:>10.1f}{r.bytes:>11}"
+            )
+    return "\n".join(lines)
+
+
+def find_regressions(
+    results: dict[str, dict[str, StageResult]],
+    baseline: dict[str, dict[str, dict[str, float]]],
+    threshold: float,
+) -> list[str]:
+    """Stages whose metrics exceed the baseline by more than ``threshold``"""
+    regressions = []
+    for case, stages in results.items():
+        for stage, r in stages.items():
+            base = baseline.get(case, {}).get(stage)
+            if base is None:
+                continue
+            for metric, value in r._asdict().items():
+                limit = base[metric] * threshold
+                if metric == "ms":
+                    limit = max(limit, base[metric] + MIN_MS_REGRESSION)
+                if base[metric] and value > limit:
+                    regressions.append(
+                        f"{case}/{stage} {metric}: {value:.2f} > {limit:.2f} "
+                        f"(baseline {base[metric]:.2f})"
+                    )
+    return regressions
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=20, help="timed runs per stage")
+    parser.add_argument("--draw-box", action="store_true", help="draw debug boxes")
+    parser.add_argument("--font", help=f"font file, default {mark_render.FONT_PATH}")
+    parser.add_argument("--save", type=Path, help="write results as a baseline")
+    parser.add_argument("--baseline", type=Path, help="compare against a baseline")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=1.2,
+        help="allowed ratio to the baseline before failing (default 1.2)",
+    )
+    args = parser.parse_args(argv)
+    if args.font:
+        mark_render.FONT_PATH = args.font
+
+    results: dict[str, dict[str, StageResult]] = {}
+    mismatched = []
+    for case, items in load_cases().items():
+        results[case], identical = run_case(items, args.repeat, args.draw_box)
+        if not identical:
+            mismatched.append(case)
+    print(format_results(results))
+
+    if args.save:
+        data = {
+            case: {stage: r._asdict() for stage, r in stages.items()}
+            for case, stages in results.items()
+        }
+        args.save.write_text(json.dumps(data, indent=2) + "\n", encoding="utf-8")
+        print(f"💾 Saved baseline to {args.save}")
+
+    failed = False
+    if mismatched:
+        print(f"❌ Glyph atlas output differs from Pillow in: {', '.join(mismatched)}")
+        failed = True
+    if args.baseline:
+        baseline = json.loads(args.baseline.read_text(encoding="utf-8"))
+        regressions = find_regressions(results, baseline, args.threshold)
+        for line in regressions:
+            print(f"❌ {line}")
+        if not regressions:
+            print(f"✅ No stage regressed beyond {args.threshold:.2f}x the baseline")
+        failed = failed or bool(regressions)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,334 @@
+"""Load test of /dict, /usage and /mark against the local stand-in API.
+
+Replays ``--users`` users sending commands at ``--qps`` for ``--duration``
+seconds. The real command functions run with fake Discord interactions,
+and the stand-in backend from ``benchmarks.stand_in_api`` is started in a
+child process unless ``--api-url`` points at one that is already running.
+Reports end-to-end latency percentiles per command, event loop lag and
+peak RSS, to size the worker dyno.
+
+    uv run python -m benchmarks.load_test --users 50 --qps 20 --duration 30
+    uv run python -m benchmarks.load_test --mix dict=1 --mean-ms 200 --error-rate 0.05
+
+Commands are subject to the per-user rate limit like in production, pass
+``--no-rate-limit`` to measure raw capacity instead.
+"""
+
+import argparse
+import asyncio
+import multiprocessing
+import os
+import random
+import resource
+import sys
+import time
+from collections.abc import Awaitable, Callable
+from typing import Any, Literal, NamedTuple
+
+import aiohttp
+
+from benchmarks.stand_in_api import add_arguments, config_from_args, serve
+
+# Settings that must be set before the bot modules can be imported
+REQUIRED_ENV = (
+    "BOT_TOKEN",
+    "GOOGLESHEET_ID",
+    "GOOGLESHEET_PRIVATE_KEY",
+    "GOOGLESHEET_PRIVATE_KEY_ID",
+    "GOOGLESHEET_CLIENT_ID",
+)
+# Replies that mean the command ran but the lookup did not succeed
+FAILURE_MARKS = ("發生錯誤", "查詢失敗", "暫時無法使用", "請求太多")
+# Seconds between event loop lag samples
+LAG_INTERVAL = 0.01
+# Hiragana used to make up the vocabulary
+KANA = [chr(c) for c in range(ord("あ"), ord("ん") + 1)]
+
+
+class FakeUser:
+    def __init__(self, user_id: int) -> None:
+        self.id = user_id
+
+
+class FakeMessage:
+    def __init__(self, content: str | None) -> None:
+        self.content = content
+
+    async def edit(self, content: str | None = None, **kwargs: Any) -> None:
+        if content is not None:
+            self.content = content
+
+    async def delete(self) -> None:
+        self.content = None
+
+
+class FakeResponse:
+    def __init__(self, interaction: "FakeInteraction") -> None:
+        self.interaction = interaction
+        self.done = False
+
+    def is_done(self) -> bool:
+        return self.done
+
+    async def defer(self, **kwargs: Any) -> None:
+        self.done = True
+
+    async def send_message(self, content: str | None = None, **kwargs: Any) -> None:
+        self.done = True
+        self.interaction.rejected = kwargs.get("ephemeral", False)
+        self.interaction.original.content = content
+
+
+class FakeFollowup:
+    def __init__(self, interaction: "FakeInteraction") -> None:
+        self.interaction = interaction
+
+    async def send(self, content: str | None = None, **kwargs: Any) -> FakeMessage:
+        message = FakeMessage(content)
+        self.interaction.followups.append(message)
+        if "files" in kwargs:
+            self.interaction.files += len(kwargs["files"])
+        return message
+
+
+class FakeInteraction:
+    """The parts of discord.Interaction the query commands use"""
+
+    def __init__(self, user_id: int) -> None:
+        self.user = FakeUser(user_id)
+        self.response = FakeResponse(self)
+        self.followup = FakeFollowup(self)
+        self.original = FakeMessage(None)
+        self.followups: list[FakeMessage] = []
+        self.files = 0
+        self.rejected = False
+
+    async def edit_original_response(
+        self, content: str | None = None, **kwargs: Any
+    ) -> FakeMessage:
+        await self.original.edit(content)
+        return self.original
+
+    def outcome(self) -> str:
+        if self.rejected:
+            return "rejected"
+        texts = [self.original.content, *(m.content for m in self.followups)]
+        if any(mark in (text or "") for text in texts for mark in FAILURE_MARKS):
+            return "failed"
+        return "ok"
+
+
+class Sample(NamedTuple):
+    command: str
+    seconds: float
+    outcome: str
+
+
+def percentile(values: list[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(int(q * len(ordered)), len(ordered) - 1)]
+
+
+def parse_mix(mix: str) -> dict[str, float]:
+    weights = {}
+    for part in mix.split(","):
+        name, _, weight = part.partition("=")
+        if name not in ("dict", "usage", "mark"):
+            raise argparse.ArgumentTypeError(f"Unknown command in mix: {name}")
+        weights[name] = float(weight or 1)
+    return weights
+
+
+async def wait_until_ready(url: str, timeout: float = 10) -> None:
+    deadline = time.monotonic() + timeout
+    async with aiohttp.ClientSession() as session:
+        while True:
+            try:
+                async with session.get(f"{url}/stats") as response:
+                    if response.status == 200:
+                        return
+            except aiohttp.ClientError:
+                if time.monotonic() > deadline:
+                    raise
+            await asyncio.sleep(0.1)
+
+
+async def backend_counts(url: str) -> dict[str, int]:
+    async with aiohttp.ClientSession() as session:
+        async with session.get(f"{url}/stats") as response:
+            counts: dict[str, int] = await response.json()
+            return counts
+
+
+async def monitor_loop_lag(lags: list[float], stop: asyncio.Event) -> None:
+    """Record how late the loop wakes up from a short sleep"""
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(LAG_INTERVAL)
+        lags.append(time.perf_counter() - start - LAG_INTERVAL)
+
+
+async def run(args: argparse.Namespace, url: str) -> list[Sample]:
+    # Imported here, the settings they read are only set up by main()
+    from cogs.dict_query import fetch_dict_link
+    from cogs.mark_text import mark
+    from cogs.usage_query import fetch_usage
+    from core.api_client import ApiClient
+    from core.cache_store import CacheStore
+    from utils.mark_render import RENDER_BACKEND
+    from utils.rate_limit import WORD_RATE_LIMITER
+
+    if args.no_rate_limit:
+        WORD_RATE_LIMITER.capacity = float("inf")
+    api = ApiClient(url)
+    cache = CacheStore(args.cache_path)
+    await cache.open()
+
+    rng = random.Random(args.seed)
+    vocab = ["".join(rng.choices(KANA, k=rng.randint(2, 4))) for _ in range(args.vocab)]
+    # A few words are looked up far more often than the rest
+    popularity = [1 / (rank + 1) for rank in range(len(vocab))]
+
+    def pick_words(count: int) -> list[str]:
+        return rng.choices(vocab, popularity, k=count)
+
+    def make_command(name: str) -> Callable[[Any], Awaitable[None]]:
+        words = " ".join(pick_words(rng.randint(1, args.words_per_query)))
+        if name == "dict":
+            return lambda i: fetch_dict_link(i, words, api, cache)
+        if name == "usage":
+            site: Literal["NLB", "NLT"] = "NLB" if rng.random() < 0.5 else "NLT"
+            return lambda i: fetch_usage(i, words, site, api, cache)
+        text = "、".join(pick_words(rng.randint(3, 8))) + "。"
+        return lambda i: mark(i, text, api, cache)
+
+    samples: list[Sample] = []
+
+    async def one_request(name: str, user_id: int) -> None:
+        command = make_command(name)
+        interaction = FakeInteraction(user_id)
+        start = time.perf_counter()
+        try:
+            await command(interaction)
+            outcome = interaction.outcome()
+        except Exception as e:
+            print(f"⚠️ {name} raised {e!r}")
+            outcome = "failed"
+        samples.append(Sample(name, time.perf_counter() - start, outcome))
+
+    mix = args.mix
+    lags: list[float] = []
+    stop = asyncio.Event()
+    monitor = asyncio.create_task(monitor_loop_lag(lags, stop))
+    tasks = []
+    start = time.perf_counter()
+    for n in range(int(args.qps * args.duration)):
+        # Open loop: requests arrive on schedule however slow the bot is
+        delay = start + n / args.qps - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        name = rng.choices(list(mix), list(mix.values()))[0]
+        tasks.append(asyncio.create_task(one_request(name, rng.randrange(args.users))))
+    await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await monitor
+
+    stats = api.stats()
+    await api.close()
+    await cache.close()
+    RENDER_BACKEND.shutdown()
+
+    print(format_report(samples, elapsed))
+    print(
+        f"\nevent loop lag: p50 {1000 * percentile(lags, 0.5):.1f} ms, "
+        f"p99 {1000 * percentile(lags, 0.99):.1f} ms, "
+        f"max {1000 * max(lags, default=0):.1f} ms"
+    )
+    # ru_maxrss is in KiB on Linux
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f"peak RSS: {peak:.1f} MiB (bot process only)")
+    print(
+        f"API requests: {stats['requests']}, coalesced {stats['coalesced']}, "
+        f"hedged {stats['hedged']}, breakers {stats['breakers']}"
+    )
+    return samples
+
+
+def format_report(samples: list[Sample], elapsed: float) -> str:
+    lines = [
+        f"{'command':<10}{'count':>7}{'ok':>7}{'failed':>8}{'rejected':>10}"
+        f"{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}"
+    ]
+    for name in sorted({s.command for s in samples}):
+        group = [s for s in samples if s.command == name]
+        # Rejected requests return at once and would flatter the latencies
+        seconds = [s.seconds for s in group if s.outcome != "rejected"]
+        counts = {o: sum(s.outcome == o for s in group) for o in ("ok", "failed")}
+        rejected = len(group) - sum(counts.values())
+        lines.append(
+            f"{name:<10}{len(group):>7}{counts['ok']:>7}{counts['failed']:>8}"
+            f"{rejected:>10}{1000 * percentile(seconds, 0.5):>9.1f}"
+            f"{1000 * percentile(seconds, 0.95):>9.1f}"
+            f"{1000 * percentile(seconds, 0.99):>9.1f}"
+        )
+    lines.append(f"\n{len(samples)} requests in {elapsed:.1f} s")
+    return "\n".join(lines)
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=20, help="distinct users")
+    parser.add_argument("--qps", type=float, default=10, help="commands per second")
+    parser.add_argument("--duration", type=float, default=20, help="seconds")
+    parser.add_argument(
+        "--mix",
+        type=parse_mix,
+        default=parse_mix("dict=3,usage=2,mark=1"),
+        help="command weights (default dict=3,usage=2,mark=1)",
+    )
+    parser.add_argument("--vocab", type=int, default=500, help="distinct words")
+    parser.add_argument(
+        "--words-per-query", type=int, default=3, help="most words per command"
+    )
+    parser.add_argument("--no-rate-limit", action="store_true")
+    parser.add_argument("--cache-path", default="", help="cache file, default none")
+    parser.add_argument("--font", help="font file for /mark")
+    parser.add_argument("--api-url", help="use a running stand-in instead")
+    parser.add_argument("--port", type=int, default=8765, help="stand-in port")
+    add_arguments(parser)
+    args = parser.parse_args(argv)
+
+    url = args.api_url or f"http://127.0.0.1:{args.port}"
+    os.environ["API_URL"] = url
+    for name in REQUIRED_ENV:
+        os.environ.setdefault(name, "load-test")
+    if args.font:
+        import utils.mark_render as mark_render
+
+        mark_render.FONT_PATH = args.font
+
+    stand_in = None
+    if not args.api_url:
+        # A separate process, so the backend does not add to the loop lag
+        stand_in = multiprocessing.get_context("spawn").Process(
+            target=serve,
+            args=(config_from_args(args), args.port, args.seed),
+            daemon=True,
+        )
+        stand_in.start()
+    try:
+        asyncio.run(wait_until_ready(url))
+        asyncio.run(run(args, url))
+        print(f"backend calls: {asyncio.run(backend_counts(url))}")
+    finally:
+        if stand_in is not None:
+            stand_in.terminate()
+            stand_in.join()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,179 @@
+"""Local stand-in for the API_URL backend, for load tests without the real one.
+
+Serves /api/DictQuery/, /api/UsageQuery/URL/ and /api/MarkAccent/ with
+responses shaped like the real API. Every request waits for a latency drawn
+from the chosen distribution, then fails with HTTP 500 at ``--error-rate``
+or answers "not found" at ``--not-found-rate``.
+
+    uv run python -m benchmarks.stand_in_api --port 8765
+    uv run python -m benchmarks.stand_in_api --latency lognormal --mean-ms 120
+
+Point API_URL at it to run the bot against it, or let
+``benchmarks.load_test`` start one.
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import random
+import zlib
+from collections import Counter
+from pathlib import Path
+from typing import Any, Literal, NamedTuple
+
+from aiohttp import web
+
+# Recorded MarkAccent items, the same fixture bench_mark_text renders
+FIXTURE = Path(__file__).parent / "fixtures" / "mark_accent_response.json"
+
+Distribution = Literal["fixed", "uniform", "exponential", "lognormal"]
+
+
+class StandInConfig(NamedTuple):
+    latency: Distribution = "lognormal"
+    mean_ms: float = 80.0
+    # Spread of the lognormal distribution, larger gives a longer tail
+    sigma: float = 0.5
+    error_rate: float = 0.0
+    not_found_rate: float = 0.05
+
+
+def draw_latency(config: StandInConfig, rng: random.Random) -> float:
+    """Seconds to wait before answering"""
+    mean = config.mean_ms / 1000
+    if config.latency == "fixed":
+        return mean
+    if config.latency == "uniform":
+        return rng.uniform(0, 2 * mean)
+    if config.latency == "exponential":
+        return rng.expovariate(1 / mean) if mean else 0.0
+    # Pick mu so the distribution's mean is ``mean``
+    if not mean:
+        return 0.0
+    return rng.lognormvariate(math.log(mean) - config.sigma**2 / 2, config.sigma)
+
+
+def _dict_result(word: str) -> list[dict[str, Any]]:
+    # The same word always gets the same entries
+    count = 1 + zlib.crc32(word.encode()) % 5
+    return [
+        {
+            "kanji": [word],
+            "furigana": [f"{word}の読み{idx}"],
+            "definitions": [
+                {"pos": ["名詞"], "meanings": [f"meaning {idx}.{n}" for n in range(3)]}
+            ],
+        }
+        for idx in range(count)
+    ]
+
+
+def _usage_result(word: str, site: str) -> list[dict[str, str]]:
+    return [{"word": word, "url": f"https://{site.lower()}.example/{word}"}]
+
+
+def _mark_result(text: str, items: list[dict[str, Any]]) -> list[dict[str, Any]]:
+    # Recorded items repeated until they cover about as many characters
+    result: list[dict[str, Any]] = []
+    length = 0
+    while length < len(text):
+        item = items[len(result) % len(items)]
+        result.append(item)
+        length += len(item["surface"])
+    return result
+
+
+def make_app(config: StandInConfig, seed: int | None = None) -> web.Application:
+    rng = random.Random(seed)
+    mark_items: list[dict[str, Any]] = json.loads(FIXTURE.read_text(encoding="utf-8"))[
+        "result"
+    ]
+    counts: Counter[str] = Counter()
+
+    async def answer(request: web.Request, endpoint: str) -> dict[str, Any]:
+        counts[endpoint] += 1
+        payload: dict[str, str] = await request.json()
+        await asyncio.sleep(draw_latency(config, rng))
+        if rng.random() < config.error_rate:
+            counts[f"{endpoint}_error"] += 1
+            raise web.HTTPInternalServerError()
+        if rng.random() < config.not_found_rate:
+            return {"status": 404, "result": [], "error": {"message": "Not found"}}
+        return {"status": 200, "result": payload}
+
+    async def dict_query(request: web.Request) -> web.Response:
+        data = await answer(request, "dict")
+        if data["status"] == 200:
+            data["result"] = _dict_result(data["result"]["word"])
+        return web.json_response(data)
+
+    async def usage_query(request: web.Request) -> web.Response:
+        data = await answer(request, "usage")
+        if data["status"] == 200:
+            payload = data["result"]
+            data["result"] = _usage_result(payload["word"], payload["site"])
+        return web.json_response(data)
+
+    async def mark_accent(request: web.Request) -> web.Response:
+        data = await answer(request, "mark")
+        if data["status"] == 200:
+            data["result"] = _mark_result(data["result"]["text"], mark_items)
+        return web.json_response(data)
+
+    async def stats(request: web.Request) -> web.Response:
+        return web.json_response(dict(counts))
+
+    app = web.Application()
+    app.router.add_post("/api/DictQuery/", dict_query)
+    app.router.add_post("/api/UsageQuery/URL/", usage_query)
+    app.router.add_post("/api/MarkAccent/", mark_accent)
+    app.router.add_get("/stats", stats)
+    return app
+
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    """Stand-in options, shared with the load test driver"""
+    parser.add_argument(
+        "--latency",
+        choices=["fixed", "uniform", "exponential", "lognormal"],
+        default="lognormal",
+        help="latency distribution (default lognormal)",
+    )
+    parser.add_argument("--mean-ms", type=float, default=80.0, help="mean latency")
+    parser.add_argument("--sigma", type=float, default=0.5, help="lognormal spread")
+    parser.add_argument(
+        "--error-rate", type=float, default=0.0, help="share of HTTP 500 answers"
+    )
+    parser.add_argument(
+        "--not-found-rate", type=float, default=0.05, help="share of 404 answers"
+    )
+    parser.add_argument("--seed", type=int, help="seed for latencies and errors")
+
+
+def config_from_args(args: argparse.Namespace) -> StandInConfig:
+    return StandInConfig(
+        latency=args.latency,
+        mean_ms=args.mean_ms,
+        sigma=args.sigma,
+        error_rate=args.error_rate,
+        not_found_rate=args.not_found_rate,
+    )
+
+
+def serve(config: StandInConfig, port: int, seed: int | None = None) -> None:
+    """Run the stand-in until interrupted"""
+    web.run_app(make_app(config, seed), host="127.0.0.1", port=port, print=None)
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=8765)
+    add_arguments(parser)
+    args = parser.parse_args(argv)
+    print(f"🧪 Stand-in API on http://127.0.0.1:{args.port}")
+    serve(config_from_args(args), args.port, args.seed)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,108 +1,351 @@
 import asyncio
-from typing import TypedDict
+import math
+import sqlite3
+from typing import Literal, TypedDict
 
-import aiohttp
+import discord
 from discord import Interaction, app_commands
 from discord.ext import commands
 
-from config.settings import API_URL
+from config.settings import (
+    DICT_CACHE_MISS_TTL,
+    DICT_LOOKUP_MODE,
+    DICT_PAGE_TIMEOUT,
+)
+from core.api_client import ApiClient, ApiStatusError, CircuitOpenError
 from core.bot_core import KumaBot
+from core.cache_store import CacheStore
+from core.offline_index import DICT_INDEX
+from utils.dict_index import DictIndex
+from utils.query_words import autocomplete_words, prepare_words
+from utils.stream_reply import MESSAGE_LIMIT, split_message, stream_results
+from utils.word_index import WORD_INDEX
+
+# Dictionary entries shown per page of the paginated view
+ENTRIES_PER_PAGE = 3
+# Characters kept free for the omitted entries note of a word
+OMITTED_NOTE_RESERVE = 40
+LOOKUP_MODES = ("remote-first", "local-first", "local-only")
+# Where entries came from, "fallback" is the index answering for a failing API
+LookupSource = Literal["remote", "local", "fallback"]
+if DICT_LOOKUP_MODE not in LOOKUP_MODES:
+    raise ValueError(f"Unknown dict lookup mode: {DICT_LOOKUP_MODE}")
+
+
+class DataItem(TypedDict):
+    kanji: list[str]
+    furigana: list[str]
+    definitions: list[dict[str, list[str]]]
+
+
+class FormattedEntries(TypedDict):
+    """Formatted entries of a word that fit in one message, and the total"""
+
+    entries: list[str]
+    total: int
 
 
 async def dict_query_handler(
-    interaction: Interaction, words: str, session: aiohttp.ClientSession
+    interaction: Interaction, words: str, api: ApiClient, cache: CacheStore
 ) -> None:
-    await fetch_dict_link(interaction, words, session)
+    await fetch_dict_link(interaction, words, api, cache)
 
 
 class DictQueryCog(commands.Cog):
     def __init__(self, bot: KumaBot) -> None:
         self.bot = bot
 
-    async def cog_unload(self) -> None:
-        """Clean up if necessary when cog is unloaded"""
-        pass
-
     @app_commands.command(name="dict", description="查詢字典連結")
-    @app_commands.describe(word="要查詢的單字，支援多個單字，用空格或逗號(,)分隔")
-    @app_commands.rename(word="單字")
-    async def dict_query(self, interaction: Interaction, word: str) -> None:
-        await fetch_dict_link(interaction, word, self.bot.session)
+    @app_commands.describe(
+        word="要查詢的單字，支援多個單字，用空格或逗號(,)分隔",
+        paginate="用按鈕逐頁查看結果，預設為否",
+    )
+    @app_commands.rename(word="單字", paginate="分頁")
+    @app_commands.autocomplete(word=autocomplete_words)
+    async def dict_query(
+        self, interaction: Interaction, word: str, paginate: bool = False
+    ) -> None:
+        if paginate:
+            await fetch_dict_pages(interaction, word, self.bot.api)
+        else:
+            await fetch_dict_link(interaction, word, self.bot.api, self.bot.cache)
 
 
 async def setup(bot: KumaBot) -> None:
     await bot.add_cog(DictQueryCog(bot))
 
 
+async def lookup_word(
+    api: ApiClient, word: str
+) -> tuple[list[DataItem] | str, LookupSource]:
+    """Dictionary entries of a word, [] if there are none or an error line,
+    and where they came from
+
+    With an offline index, DICT_LOOKUP_MODE decides whether it is asked
+    before the API, only when the API fails, or instead of the API.
+    """
+    if DICT_INDEX is not None and DICT_LOOKUP_MODE != "remote-first":
+        entries = await _lookup_local(DICT_INDEX, word)
+        if entries or DICT_LOOKUP_MODE == "local-only":
+            return entries, "local"
+    result = await _lookup_remote(api, word)
+    if (
+        isinstance(result, str)
+        and DICT_INDEX is not None
+        and DICT_LOOKUP_MODE == "remote-first"
+    ):
+        # The API is failing, answer from the index when it has the word
+        if entries := await _lookup_local(DICT_INDEX, word):
+            return entries, "fallback"
+    return result, "remote"
+
+
+async def _lookup_local(index: DictIndex, word: str) -> list[DataItem]:
+    try:
+        entries: list[DataItem] = await asyncio.to_thread(index.lookup, word)
+    except sqlite3.Error as e:
+        print(f"dict_query index error for '{word}': {e}")
+        return []
+    if entries:
+        WORD_INDEX.add(word)
+    return entries
+
+
+async def _lookup_remote(api: ApiClient, word: str) -> list[DataItem] | str:
+    try:
+        data = await api.dict_query(word)
+        if data["status"] == 200:
+            entries: list[DataItem] = data["result"]
+            if entries:
+                WORD_INDEX.add(word)
+            return entries
+        elif data["status"] == 404:
+            return []
+        else:
+            return f"❌ **{word}**: 查詢失敗，錯誤內容({data['status']}: \
+                {data['error'].get('message', '未知錯誤')})"
+    except ApiStatusError as e:
+        return f"❌ **{word}**: 查詢失敗，錯誤代碼 {e.status}"
+    except CircuitOpenError as e:
+        return (
+            f"❌ **{word}**: 查詢服務暫時無法使用，"
+            f"請在 {math.ceil(e.retry_after)} 秒後再試"
+        )
+    except Exception as e:
+        print(f"dict_query error for '{word}': {e}")
+        return f"❌ **{word}**: 發生錯誤"
+
+
+def format_entry(idx: int, item: DataItem) -> str:
+    kanji = f"{idx}. {', '.join(item.get('kanji', ''))}"
+    furigana = f"【{', '.join(item.get('furigana', ''))}】"
+    definitions = ""
+    for definition in item.get("definitions", []):
+        pos = f"({', '.join(p)})" if (p := definition.get("pos", [])) else ""
+        meanings = f"▶ {' ▶ '.join(definition.get('meanings', []))}"
+        definitions += f"> {pos} {meanings}\n"
+    return f"{kanji} {furigana}\n{definitions}"
+
+
+def format_entries(entries: list[DataItem], budget: int) -> list[str]:
+    """Format entries until ``budget`` characters are used, at least one
+
+    The rest of the entries are not looked at.
+    """
+    formatted: list[str] = []
+    used = 0
+    for idx, item in enumerate(entries, 1):
+        entry = format_entry(idx, item)
+        if formatted and used + len(entry) > budget:
+            break
+        formatted.append(entry)
+        used += len(entry)
+    return formatted
+
+
+def render_entries(word: str, result: FormattedEntries, budget: int) -> str:
+    """The reply for one word within about ``budget`` characters"""
+    if not result["total"]:
+        return f"❌ **{word}**: 查無結果"
+    message = f"📚 **{word}**:\n"
+    limit = budget - OMITTED_NOTE_RESERVE
+    shown = 0
+    for entry in result["entries"]:
+        if shown and len(message) + len(entry) > limit:
+            break
+        message += entry
+        shown += 1
+    if omitted := result["total"] - shown:
+        message += f"-# 還有 {omitted} 筆結果未顯示，可用 /dict 分頁 查看全部\n"
+    return message
+
+
 async def fetch_dict_link(
-    interaction: Interaction, words: str, session: aiohttp.ClientSession
+    interaction: Interaction, words: str, api: ApiClient, cache: CacheStore
 ) -> None:
-    # Remove extra spaces and split by spaces or commas
-    word_list = [
-        word.strip() for word in words.replace(",", " ").split() if word.strip()
-    ]
-    if not word_list:
-        await interaction.response.send_message("❌ 請提供有效的單字！", ephemeral=True)
+    prepared = await prepare_words(interaction, words)
+    if prepared is None:
         return
-    await interaction.response.defer()
+    word_list, notice = prepared
+    # Formatted entries keyed on the normalized word, shared by /dict and the
+    # context menu. "查無結果" answers and offline answers given while the API
+    # fails are kept for DICT_CACHE_MISS_TTL.
+    dict_cache = cache.namespace("dict")
+    # One message split fairly between the words, lines are joined by "\n"
+    budget = (MESSAGE_LIMIT - len(notice)) // len(word_list) - 1
 
     async def query_single_word(word: str) -> str:
         """Query a single word and return formatted result"""
-        query_data = {"word": word}
-        try:
-            async with session.post(
-                f"{API_URL}/api/DictQuery/", json=query_data
-            ) as response:
-                if response.status == 200:
-                    data = await response.json()
-                    if data["status"] == 200:
-
-                        class DataItem(TypedDict):
-                            kanji: list[str]
-                            furigana: list[str]
-                            definitions: list[dict[str, list[str]]]
-
-                        item: DataItem
-                        ret = []
-                        for idx, item in enumerate(data["result"], 1):
-                            kanji = f"{idx}. {', '.join(item.get('kanji', ''))}"
-                            furigana = f"【{', '.join(item.get('furigana', ''))}】"
-                            definitions = ""
-                            for definition in item.get("definitions", []):
-                                pos = (
-                                    f"({', '.join(p)})"
-                                    if (p := definition.get("pos", []))
-                                    else ""
-                                )
-                                meanings = (
-                                    f"▶ {' ▶ '.join(definition.get('meanings', []))}"
-                                )
-                                definitions += f"> {pos} {meanings}\n"
-                            ret.append(f"{kanji} {furigana}\n{definitions}")
-                        return f"📚 **{word}**:\n{''.join(ret)}"
-                    elif data["status"] == 404:
-                        return f"❌ **{word}**: 查無結果"
-                    else:
-                        return f"❌ **{word}**: 查詢失敗，錯誤內容({data['status']}: \
-                            {data['error'].get('message', '未知錯誤')})"
-                else:
-                    return f"❌ **{word}**: 查詢失敗，錯誤代碼 {response.status}"
-        except Exception as e:
-            print(f"dict_query error for '{word}': {e}")
-            return f"❌ **{word}**: 發生錯誤"
+        cached: FormattedEntries | None = await dict_cache.get(word)
+        if cached is not None:
+            if cached["total"]:
+                WORD_INDEX.add(word)
+            return render_entries(word, cached, budget)
+        entries, source = await lookup_word(api, word)
+        if isinstance(entries, str):
+            return entries
+        # A word never gets more than a whole message, so only that much is
+        # formatted and cached whatever this request's budget is
+        result: FormattedEntries = {
+            "entries": format_entries(entries, MESSAGE_LIMIT),
+            "total": len(entries),
+        }
+        ttl = None if entries and source != "fallback" else DICT_CACHE_MISS_TTL
+        await dict_cache.set(word, result, ttl=ttl)
+        return render_entries(word, result, budget)
 
     try:
-        # Process all words concurrently
-        tasks = [query_single_word(word) for word in word_list]
-        results = await asyncio.gather(*tasks)
-
-        if results:
-            response_text = "\n".join(results)
-            if len(response_text) > 2000:
-                response_text = response_text[:1997] + "..."
-            await interaction.followup.send(response_text)
+        # Query all words concurrently, showing each result as it arrives
+        await stream_results(
+            interaction,
+            word_list,
+            query_single_word,
+            pending=lambda word: f"⏳ **{word}**: 查詢中…",
+            header=notice,
+        )
+    except Exception as e:
+        await interaction.followup.send("❌ 發生錯誤，請稍後再試")
+        print(f"dict_query general error: {e}")
+
+
+class DictPages(discord.ui.View):
+    """Page through the entries of several words, one word at a time
+
+    A word is looked up only when one of its pages is first shown and only
+    the current page is formatted. Entries are dropped when the view times
+    out.
+    """
+
+    def __init__(
+        self, owner_id: int, words: list[str], api: ApiClient, notice: str
+    ) -> None:
+        super().__init__(timeout=DICT_PAGE_TIMEOUT)
+        self.owner_id = owner_id
+        self.words = words
+        self.api = api
+        self.notice = notice
+        self.word_idx = 0
+        self.offset = 0
+        self.entries: dict[int, list[DataItem] | str] = {}
+        self.message: discord.InteractionMessage | None = None
+
+    async def current_entries(self) -> list[DataItem] | str:
+        if self.word_idx not in self.entries:
+            self.entries[self.word_idx], _ = await lookup_word(
+                self.api, self.words[self.word_idx]
+            )
+        return self.entries[self.word_idx]
+
+    @staticmethod
+    def last_offset(entries: list[DataItem] | str) -> int:
+        if isinstance(entries, str) or not entries:
+            return 0
+        return (len(entries) - 1) // ENTRIES_PER_PAGE * ENTRIES_PER_PAGE
+
+    async def render(self) -> str:
+        word = self.words[self.word_idx]
+        entries = await self.current_entries()
+        if isinstance(entries, str):
+            body = entries
+        elif not entries:
+            body = f"❌ **{word}**: 查無結果"
         else:
-            await interaction.followup.send("❌ 找不到結果")
+            page = entries[self.offset : self.offset + ENTRIES_PER_PAGE]
+            formatted = "".join(
+                format_entry(idx, item)
+                for idx, item in enumerate(page, self.offset + 1)
+            )
+            shown = f"{self.offset + 1}-{self.offset + len(page)}/{len(entries)}"
+            body = f"📚 **{word}** ({shown}):\n{formatted}"
+
+        at_last_word = self.word_idx == len(self.words) - 1
+        self.previous_page.disabled = self.word_idx == 0 and self.offset == 0
+        self.next_page.disabled = at_last_word and self.offset >= self.last_offset(
+            entries
+        )
+        footer = f"-# 單字 {self.word_idx + 1}/{len(self.words)}"
+        text = "\n".join(part for part in (self.notice, body.rstrip(), footer) if part)
+        # Only a page of very long entries gets here, keep the first message
+        return split_message(text)[0]
+
+    async def interaction_check(self, interaction: Interaction) -> bool:
+        if interaction.user.id != self.owner_id:
+            await interaction.response.send_message(
+                "❌ 只有查詢的人可以翻頁，請自行使用 /dict 查詢", ephemeral=True
+            )
+            return False
+        return True
+
+    async def show(self, interaction: Interaction) -> None:
+        await interaction.edit_original_response(content=await self.render(), view=self)
+
+    @discord.ui.button(label="◀ 上一頁", style=discord.ButtonStyle.secondary)
+    async def previous_page(
+        self, interaction: Interaction, button: discord.ui.Button["DictPages"]
+    ) -> None:
+        # Looking up a word may take longer than Discord waits for a response
+        await interaction.response.defer()
+        if self.offset > 0:
+            self.offset -= ENTRIES_PER_PAGE
+        elif self.word_idx > 0:
+            self.word_idx -= 1
+            self.offset = self.last_offset(await self.current_entries())
+        await self.show(interaction)
+
+    @discord.ui.button(label="下一頁 ▶", style=discord.ButtonStyle.primary)
+    async def next_page(
+        self, interaction: Interaction, button: discord.ui.Button["DictPages"]
+    ) -> None:
+        await interaction.response.defer()
+        if self.offset < self.last_offset(await self.current_entries()):
+            self.offset += ENTRIES_PER_PAGE
+        elif self.word_idx < len(self.words) - 1:
+            self.word_idx += 1
+            self.offset = 0
+        await self.show(interaction)
+
+    async def on_timeout(self) -> None:
+        self.entries.clear()
+        if self.message is not None:
+            try:
+                await self.message.edit(view=None)
+            except discord.HTTPException as e:
+                print(f"dict_query failed to remove page buttons: {e}")
+
+
+async def fetch_dict_pages(
+    interaction: Interaction, words: str, api: ApiClient
+) -> None:
+    prepared = await prepare_words(interaction, words)
+    if prepared is None:
+        return
+    word_list, notice = prepared
+
+    try:
+        view = DictPages(interaction.user.id, word_list, api, notice)
+        view.message = await interaction.edit_original_response(
+            content=await view.render(), view=view
+        )
     except Exception as e:
         await interaction.followup.send("❌ 發生錯誤，請稍後再試")
         print(f"dict_query general error: {e}")
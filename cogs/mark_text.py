@@ -1,318 +1,207 @@
 import asyncio
 import io
+import math
+import re
+import unicodedata
+from typing import Any, Literal
 
-import aiohttp
 import discord
 from discord import Interaction, app_commands
 from discord.ext import commands
-from PIL import Image, ImageDraw, ImageFont
-from PIL.ImageDraw import ImageDraw as ImageDrawType
 
-from config.settings import API_URL
+from config.settings import (
+    MARK_ACCENT_CONCURRENCY,
+    MARK_MAX_LINES_PER_PAGE,
+)
+from core.api_client import ApiClient, CircuitOpenError
 from core.bot_core import KumaBot
+from core.cache_store import CacheStore
+from core.offline_index import ACCENT_INDEX
+from utils.accent_index import AccentIndex
+from utils.font_registry import FONT_REGISTRY
+from utils.glyph_atlas import GLYPH_ATLAS
+from utils.image_encoding import FILE_EXTENSIONS, ImageEncoding
+from utils.mark_layout import Token, paginate
+from utils.mark_render import IMAGE_CACHE, RENDER_BACKEND, generate_bytes
+from utils.render_backend import RenderBusyError
 
+# Discord allows at most 10 attachments per message
+MAX_ATTACHMENTS = 10
 
-async def mark_text_handler(
-    interaction: Interaction, text: str, session: aiohttp.ClientSession
-) -> None:
-    await mark(interaction, text, session)
+# A sentence ends after 。！？ or a newline. Runs of them and the closing
+# brackets right after them stay with the sentence, so 「行く。」 is one piece.
+SENTENCE = re.compile(r"[^。！？\n]*(?:[。！？\n][。！？\n」』）)]*)?")
 
 
-async def get_furigana_via_api(
-    sentence: str, session: aiohttp.ClientSession
-) -> list[tuple[str, str, list[int]]]:
-    url = f"{API_URL}/api/MarkAccent/"
-    try:
-        async with session.post(url, json={"text": sentence}) as resp:
-            if resp.status == 200:
-                data = await resp.json()
-                if data["status"] == 200 and data["result"]:
-                    result = []
-                    for item in data["result"]:
-                        surface = item["surface"]
-                        furigana = item["furigana"]
-                        accent = [a["accent_marking_type"] for a in item["accent"]]
-
-                        # check subword
-                        if "subword" in item and item["subword"]:
-                            for sw in item["subword"]:
-                                sw_surface = sw["surface"]
-                                sw_furi = sw["furigana"]
-                                # check if subowrd have kanji
-                                if any("\u4e00" <= c <= "\u9fff" for c in sw_surface):
-                                    result.append(
-                                        (
-                                            sw_surface,
-                                            sw_furi,
-                                            accent[: len(sw_furi)],
-                                        )
-                                    )
-                                    accent = accent[len(sw_furi) :]
-                                else:
-                                    result.append(
-                                        (
-                                            sw_surface,
-                                            sw_surface,
-                                            accent[: len(sw_surface)],
-                                        )
-                                    )
-                                    accent = accent[len(sw_surface) :]
-                        else:
-                            result.append((surface, furigana, accent))
-                    return result
-    except Exception as e:
-        print("API error:", e)
-    return []
-
-
-# accent rendering
-def draw_accent(
-    d: ImageDrawType,
-    x: int,
-    y: int,
-    width: int,
-    furi_height: int,
-    accent_type: int,
-    n_kanji: int,
-    n_furi: int,
-    idx: int,
-    furi_yes: int,
+async def mark_text_handler(
+    interaction: Interaction, text: str, api: ApiClient, cache: CacheStore
 ) -> None:
-    """
-    d: ImageDraw object
-    x, y: 左上角位置
-    width: 該文字區域寬度
-    furi_height: 振假名高度 (用來估算線的垂直位置)
-    accent_type: 0,1,2
-    """
-    line_y = y - 30  # furi高度
-
-    # 沒furi 畫線寬度漢字寬
-    if furi_yes == 0:
-        if accent_type == 1:
-            d.line(
-                (x + idx * width, line_y, x + (idx + 1) * width, line_y),
-                fill=(255, 0, 0),
-                width=2,
-            )
-        elif accent_type == 2:
-            d.line(
-                (x + idx * width, line_y, x + (idx + 1) * width, line_y),
-                fill=(255, 0, 0),
-                width=2,
-            )
-            d.line(
-                (
-                    x + (idx + 1) * width,
-                    line_y,
-                    x + (idx + 1) * width,
-                    line_y + furi_height,
-                ),
-                fill=(255, 0, 0),
-                width=2,
-            )
-        else:
-            pass
+    await mark(interaction, text, api, cache)
 
-    # 有furi 畫線寬度furi寬
-    else:
-        n_start = (n_kanji / 2 - n_furi / 4) * width
-        if accent_type == 1:
-            d.line(
-                (
-                    x + n_start + idx * width / 2,
-                    line_y,
-                    x + n_start + (idx + 1) * width / 2,
-                    line_y,
-                ),
-                fill=(255, 0, 0),
-                width=2,
-            )
-            if idx == 0:
-                d.line((x, line_y, x + n_start, line_y), fill=(255, 0, 0), width=2)
-            elif idx == n_furi - 1:
-                d.line(
-                    (
-                        x + n_start + (idx + 1) * width / 2,
-                        line_y,
-                        x + n_kanji * width,
-                        line_y,
-                    ),
-                    fill=(255, 0, 0),
-                    width=2,
-                )
-        elif accent_type == 2:
-            d.line(
-                (
-                    x + n_start + idx * width / 2,
-                    line_y,
-                    x + n_start + (idx + 1) * width / 2,
-                    line_y,
-                ),
-                fill=(255, 0, 0),
-                width=2,
-            )
-            d.line(
-                (
-                    x + n_start + (idx + 1) * width / 2,
-                    line_y,
-                    x + n_start + (idx + 1) * width / 2,
-                    line_y + furi_height,
-                ),
-                fill=(255, 0, 0),
-                width=2,
-            )
-            if idx == 0:
-                d.line((x, line_y, x + n_start, line_y), fill=(255, 0, 0), width=2)
-        else:
-            pass
-
-
-def is_kanji(char: str) -> bool:
-    return "\u4e00" <= char <= "\u9fff"
-
-
-def _generate_image(
-    query: list[tuple[str, str, list[int]]], draw_box: bool = False
-) -> io.BytesIO:
-    """Synchronous image generation function, should be executed in the thread pool"""
-    base_font_size = 40
-    furi_font_size = 20
-    max_word_per_line = 40
-    spacing = 40
-    boarder_size = 20
-    furi_ratio = 0.5
-    font = ImageFont.truetype("./font/NotoSerifJP-Regular.otf", base_font_size)
-    furi_font = ImageFont.truetype("./font/NotoSerifJP-Regular.otf", furi_font_size)
-
-    tmp_img = Image.new(mode="RGB", size=(100, 100), color=(255, 255, 255))
-    tmp_draw = ImageDraw.Draw(tmp_img)
-
-    # 自動換行
-    lines: list[list[tuple[str, str, list[int]]]] = []
-    current_line: list[tuple[str, str, list[int]]] = []
-    char_cnt: int = 0
-    for surface, furigana, accent in query:
-        if char_cnt + len(surface) > max_word_per_line:
-            lines.append(current_line)
-            current_line = []
-            char_cnt = 0
-        current_line.append((surface, furigana, accent))
-        char_cnt += len(surface)
-    if current_line:
-        lines.append(current_line)
-
-    query_with_newlines = "\n".join(
-        "".join(surface for surface, _, _ in line) for line in lines
-    )
-    lines_num = len(lines)
-    word_per_line = max(
-        (sum(len(surface) for surface, _, _ in line) for line in lines), default=1
-    )
 
-    bbox = tmp_draw.multiline_textbbox(
-        (0, 0), query_with_newlines, font=font, spacing=spacing, align="left"
-    )
-    furi_height = int(spacing * furi_ratio)
-    empty_space = spacing - furi_height
-    width = bbox[2] - bbox[0] + 2 * boarder_size
-    height = bbox[3] - bbox[1] + spacing + 2 * boarder_size - empty_space
-    height += furi_height + 20
-
-    furi_width = (width - 2 * boarder_size) / word_per_line
-    padding_height = (height - 2 * boarder_size + empty_space) / max(lines_num, 1)
-    kanji_height = padding_height - empty_space
-
-    img = Image.new(mode="RGBA", size=(int(width), int(height)), color=(0, 0, 0, 0))
-    d = ImageDraw.Draw(img)
-
-    char_cnt = 0
-    current_line_cnt: int = 0
-    for surface, furigana, accent in query:
-        if char_cnt + len(surface) > max_word_per_line:
-            char_cnt = 0
-            current_line_cnt += 1
-
-        x = char_cnt * furi_width + boarder_size
-        y_base = (
-            boarder_size + spacing
-            if lines_num == 1
-            else current_line_cnt * padding_height + boarder_size + empty_space
-        )
+def normalize_sentence(sentence: str) -> str:
+    return unicodedata.normalize("NFC", sentence).strip()
 
-        if draw_box:
-            d.rectangle(
-                (x, y_base - furi_height, x + furi_width * len(surface), y_base),
-                outline=(255, 0, 0),
-            )
-            d.rectangle(
-                (x, y_base, x + furi_width * len(surface), y_base + kanji_height),
-                outline=(0, 0, 255),
-            )
 
-        # 畫 furigana（只對漢字）
-        if furigana and furigana != surface and any(is_kanji(c) for c in surface):
-            center_x = int(x + furi_width * len(surface) / 2)
-            furi_y = y_base - 5
-            d.text(
-                (center_x, furi_y),
-                furigana,
-                fill=(255, 255, 255, 255),
-                font=furi_font,
-                anchor="mb",
-            )
+def split_sentences(text: str) -> list[str]:
+    return [chunk for chunk in SENTENCE.findall(text) if chunk]
 
-        # 畫漢字/假名
-        d.text(
-            (x, y_base + kanji_height / 2 - 20),
-            surface,
-            fill=(255, 255, 255, 255),
-            font=font,
-            anchor="lm",
-        )
 
-        # 畫 accent
-        accent_list = accent
-        kanji_len = len(surface)
-        furi_len = len(furigana) if furigana else kanji_len
-        furi_yes = (
-            1
-            if furigana and furigana != surface and any(is_kanji(c) for c in surface)
-            else 0
-        )
-        for idx, a in enumerate(accent_list):
-            draw_accent(
-                d,
-                int(x),
-                int(y_base),
-                int(furi_width),
-                furi_height,
-                a,
-                kanji_len,
-                furi_len,
-                idx,
-                furi_yes,
-            )
+async def get_furigana_via_api(
+    sentence: str, api: ApiClient, cache: CacheStore
+) -> tuple[list[Token], bool]:
+    """Look up furigana and accents sentence by sentence, concurrently
+
+    With an offline index, sentences it fully covers are resolved locally.
+    Any other sentence is sent whole, so particles keep the context their
+    pitch depends on. When that lookup fails, only the words the index knows
+    are marked. Returns the tokens and whether every sentence was answered.
+    """
+    pieces: list[list[Token] | str] = []
+    for chunk in split_sentences(normalize_sentence(sentence)):
+        tokens = None if ACCENT_INDEX is None else ACCENT_INDEX.resolve(chunk)
+        pieces.append(chunk if tokens is None else tokens)
+    # Repeated sentences are only looked up once
+    unique = list(dict.fromkeys(p for p in pieces if isinstance(p, str)))
+    # Bounds the lookups of this text only, ApiClient bounds the endpoint
+    limit = asyncio.Semaphore(MARK_ACCENT_CONCURRENCY)
+    results = await asyncio.gather(
+        *(_get_chunk_accent(c, api, cache, limit) for c in unique)
+    )
+    by_chunk: dict[str, list[Token]] = {}
+    complete = True
+    for chunk, result in zip(unique, results):
+        if result is None:
+            # Without an index, one failed sentence fails the whole text
+            # rather than dropping words
+            if ACCENT_INDEX is None:
+                return [], False
+            print(f"MarkAccent failed, marking indexed words only: {chunk}")
+            result = _index_tokens(ACCENT_INDEX, chunk)
+            complete = False
+        by_chunk[chunk] = result
+    tokens = [
+        token
+        for piece in pieces
+        for token in (by_chunk[piece] if isinstance(piece, str) else piece)
+    ]
+    return tokens, complete
+
+
+async def _get_chunk_accent(
+    sentence: str, api: ApiClient, cache: CacheStore, limit: asyncio.Semaphore
+) -> list[Token] | None:
+    """Look up a single sentence, from the cache when possible"""
+    accent_cache = cache.namespace("mark")
+    # Parsed results keyed on the normalized sentence, tokens come back from
+    # JSON as lists
+    if (stored := await accent_cache.get(sentence)) is not None:
+        return [(surface, furi, accent) for surface, furi, accent in stored]
+
+    async with limit:
+        try:
+            result = await _query_mark_accent(sentence, api)
+        except CircuitOpenError:
+            # The caller falls back to the index, without one the user is
+            # told when to retry
+            if ACCENT_INDEX is None:
+                raise
+            result = None
+    # Failed lookups are not cached
+    if result is not None:
+        await accent_cache.set(sentence, result)
+    return result
+
+
+def _index_tokens(index: AccentIndex, sentence: str) -> list[Token]:
+    """Tokens of the indexed words in ``sentence``, the rest without readings"""
+    return [
+        piece if isinstance(piece, tuple) else (piece, piece, [0] * len(piece))
+        for piece in index.segment(sentence)
+    ]
+
+
+def parse_mark_accent(items: list[dict[str, Any]]) -> list[Token]:
+    """Turn the ``result`` list of a MarkAccent response into tokens"""
+    result = []
+    for item in items:
+        surface = item["surface"]
+        furigana = item["furigana"]
+        accent = [a["accent_marking_type"] for a in item["accent"]]
+
+        # check subword
+        if "subword" in item and item["subword"]:
+            for sw in item["subword"]:
+                sw_surface = sw["surface"]
+                sw_furi = sw["furigana"]
+                # check if subowrd have kanji
+                if any("\u4e00" <= c <= "\u9fff" for c in sw_surface):
+                    result.append((sw_surface, sw_furi, accent[: len(sw_furi)]))
+                    accent = accent[len(sw_furi) :]
+                else:
+                    result.append((sw_surface, sw_surface, accent[: len(sw_surface)]))
+                    accent = accent[len(sw_surface) :]
+        else:
+            result.append((surface, furigana, accent))
+    return result
 
-        char_cnt += len(surface)
 
-    buffer = io.BytesIO()
-    img.save(buffer, format="PNG")
-    buffer.seek(0)
-    return buffer
+async def _query_mark_accent(sentence: str, api: ApiClient) -> list[Token] | None:
+    """Tokens of ``sentence``, None if the lookup failed
 
+    An empty list is a successful answer with nothing in it.
+    """
+    try:
+        data = await api.mark_accent(sentence)
+        if data["status"] == 200:
+            return parse_mark_accent(data["result"] or [])
+        print("API error:", data.get("error"))
+    except CircuitOpenError:
+        # Left to the caller, which knows whether the index can stand in
+        raise
+    except Exception as e:
+        print("API error:", e)
+    return None
 
-async def text2png(
-    query: str, session: aiohttp.ClientSession, draw_box: bool = False
-) -> tuple[bool, io.BufferedIOBase | None]:
-    result = await get_furigana_via_api(query, session)
-    if not result:
-        print("API 讀取失敗")
-        return False, None
 
-    # Execute image generation in thread pool
-    buffer = await asyncio.to_thread(_generate_image, result, draw_box)
-    return True, buffer
+async def text2png(
+    query: str,
+    api: ApiClient,
+    cache: CacheStore,
+    draw_box: bool = False,
+    encoding: ImageEncoding = "png",
+    max_pages: int = MAX_ATTACHMENTS,
+) -> tuple[bool, list[io.BufferedIOBase], int]:
+    """Render ``query`` as one image per page of wrapped lines
+
+    Returns whether it succeeded, the first ``max_pages`` page images and
+    the total number of pages.
+    """
+    key = (normalize_sentence(query), draw_box, encoding, max_pages)
+    if (cached := IMAGE_CACHE.get(key)) is not None:
+        images, total_pages = cached
+    else:
+        result, complete = await get_furigana_via_api(query, api, cache)
+        if not result:
+            print("API 讀取失敗")
+            return False, [], 0
+
+        # Each page is rendered on its own, so memory is bounded per page.
+        # SVG has no canvas to bound, so the whole text stays one document.
+        if encoding == "svg":
+            pages = [result]
+        else:
+            pages = paginate(result, MARK_MAX_LINES_PER_PAGE)
+        jobs = [(page, draw_box, encoding) for page in pages[:max_pages]]
+        # Execute image generation on the render backend
+        images = tuple(await RENDER_BACKEND.run_many(generate_bytes, jobs))
+        total_pages = len(pages)
+        # Pages drawn from the index alone are redrawn once the API answers
+        if complete:
+            IMAGE_CACHE.set(key, (images, total_pages))
+    # BytesIO shares an immutable bytes object until written to, so cached
+    # images are not copied (a memoryview would be)
+    return True, [io.BytesIO(data) for data in images], total_pages
 
 
 class MarkCog(commands.Cog):
@@ -320,14 +209,44 @@ class MarkCog(commands.Cog):
         self.bot = bot
 
     async def cog_unload(self) -> None:
-        """Clean up if necessary when cog is unloaded"""
-        pass
+        """Stop render workers and release cached fonts when cog is unloaded"""
+        RENDER_BACKEND.shutdown()
+        image_stats = IMAGE_CACHE.stats()
+        IMAGE_CACHE.clear()
+        print(
+            f"🖼️ Image cache: {image_stats['hits']:.0f} hits / "
+            f"{image_stats['misses']:.0f} misses, "
+            f"{image_stats['bytes'] / 1024:.0f} KiB released"
+        )
+        stats = FONT_REGISTRY.stats()
+        FONT_REGISTRY.clear()
+        GLYPH_ATLAS.clear()
+        print(
+            f"🔤 Font cache released ({stats['fonts']} fonts, "
+            f"{stats['hits']} hits / {stats['misses']} misses)"
+        )
 
     @app_commands.command(name="mark", description="標記日文文字的假名和音調")
-    @app_commands.describe(text="要查詢的文字")
-    @app_commands.rename(text="文字")
-    async def usage_query(self, interaction: Interaction, text: str) -> None:
-        await mark(interaction, text, self.bot.session)
+    @app_commands.describe(
+        text="要查詢的文字",
+        encoding="圖片格式，預設為PNG",
+    )
+    @app_commands.choices(
+        encoding=[
+            app_commands.Choice(name="PNG", value="png"),
+            app_commands.Choice(name="PNG (調色盤，檔案較小)", value="palette"),
+            app_commands.Choice(name="WebP (無損)", value="webp"),
+            app_commands.Choice(name="SVG (向量圖，可任意縮放)", value="svg"),
+        ]
+    )
+    @app_commands.rename(text="文字", encoding="格式")
+    async def usage_query(
+        self,
+        interaction: Interaction,
+        text: str,
+        encoding: Literal["png", "palette", "webp", "svg"] = "png",
+    ) -> None:
+        await mark(interaction, text, self.bot.api, self.bot.cache, encoding)
 
 
 async def setup(bot: KumaBot) -> None:
@@ -335,7 +254,11 @@ async def setup(bot: KumaBot) -> None:
 
 
 async def mark(
-    interaction: Interaction, text: str, session: aiohttp.ClientSession
+    interaction: Interaction,
+    text: str,
+    api: ApiClient,
+    cache: CacheStore,
+    encoding: ImageEncoding = "png",
 ) -> None:
     try:
         if len(text) < 2:
@@ -343,12 +266,33 @@ async def mark(
             return
         print("Generating image for:", text)
         await interaction.response.defer()
-        success, buffer = await text2png(text, session, draw_box=False)
+        success, buffers, total_pages = await text2png(
+            text, api, cache, draw_box=False, encoding=encoding
+        )
         assert success is True, "Image generation failed"
-        assert buffer, "Buffer should not be None when success is True"
+        assert buffers, "Buffers should not be empty when success is True"
+        extension = FILE_EXTENSIONS[encoding]
+        if len(buffers) == 1:
+            files = [discord.File(buffers[0], filename=f"marked_text.{extension}")]
+        else:
+            files = [
+                discord.File(buffer, filename=f"marked_text_{idx}.{extension}")
+                for idx, buffer in enumerate(buffers, 1)
+            ]
+        if total_pages > len(buffers):
+            await interaction.followup.send(
+                f"⚠️ 文字過長，只顯示前 {len(buffers)}/{total_pages} 頁", files=files
+            )
+        else:
+            await interaction.followup.send(files=files)
+    except CircuitOpenError as e:
+        print(f"MarkAccent unavailable: {e}")
         await interaction.followup.send(
-            file=discord.File(buffer, filename="marked_text.png")
+            f"⏳ 標記服務暫時無法使用，請在 {math.ceil(e.retry_after)} 秒後再試。"
         )
+    except RenderBusyError as e:
+        print(f"Render queue is full: {e}")
+        await interaction.followup.send("⏳ 目前產生圖片的請求太多，請稍後再試。")
     except Exception as e:
         print(f"Error in mark function: {e}")
         await interaction.followup.send(f"發生錯誤：{e}")
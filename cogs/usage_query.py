@@ -1,21 +1,25 @@
-import asyncio
+import math
 from typing import Literal
 
-import aiohttp
 from discord import Interaction, app_commands
 from discord.ext import commands
 
-from config.settings import API_URL
+from core.api_client import ApiClient, ApiStatusError, CircuitOpenError
 from core.bot_core import KumaBot
+from core.cache_store import CacheStore
+from utils.query_words import autocomplete_words, prepare_words
+from utils.stream_reply import stream_results
+from utils.word_index import WORD_INDEX
 
 
 async def usage_query_handler(
     interaction: Interaction,
     words: str,
     site: Literal["NLB", "NLT"],
-    session: aiohttp.ClientSession,
+    api: ApiClient,
+    cache: CacheStore,
 ) -> None:
-    await fetch_usage(interaction, words, site, session)
+    await fetch_usage(interaction, words, site, api, cache)
 
 
 class UsageQueryCog(commands.Cog):
@@ -38,10 +42,11 @@ class UsageQueryCog(commands.Cog):
         ]
     )
     @app_commands.rename(word="單字", site="來源")
+    @app_commands.autocomplete(word=autocomplete_words)
     async def usage_query(
         self, interaction: Interaction, word: str, site: Literal["NLB", "NLT"]
     ) -> None:
-        await fetch_usage(interaction, word, site, self.bot.session)
+        await fetch_usage(interaction, word, site, self.bot.api, self.bot.cache)
 
 
 async def setup(bot: KumaBot) -> None:
@@ -52,57 +57,60 @@ async def fetch_usage(
     interaction: Interaction,
     words: str,
     site: Literal["NLB", "NLT"],
-    session: aiohttp.ClientSession,
+    api: ApiClient,
+    cache: CacheStore,
 ) -> None:
-    word_list = [
-        word.strip() for word in words.replace(",", " ").split() if word.strip()
-    ]
-    if not word_list:
-        await interaction.response.send_message("❌ 請提供有效的單字！", ephemeral=True)
+    prepared = await prepare_words(interaction, words)
+    if prepared is None:
         return
-    await interaction.response.defer()
+    word_list, notice = prepared
+    # Found links keyed on the site and normalized word
+    usage_cache = cache.namespace("usage")
 
     async def query_single_usage(word: str) -> str:
         """Query usage for a single word and return formatted result"""
-        query_data = {"word": word, "site": site}
+        cached: str | None = await usage_cache.get(f"{site}:{word}")
+        if cached is not None:
+            WORD_INDEX.add(word)
+            return cached
         try:
-            async with session.post(
-                f"{API_URL}/api/UsageQuery/URL/", json=query_data
-            ) as response:
-                if response.status == 200:
-                    data = await response.json()
-                    if data["status"] == 200:
-                        items: list[dict[str, str]] = data["result"]
-                        if len(items) == 1:
-                            message = f"📚 **{items[0]['word']}**: {items[0]['url']}"
-                        elif len(items) > 1:
-                            result_lines = [f"📚 **{word}**:"]
-                            for item in items:
-                                result_lines.append(f"- {item['word']}: {item['url']}")
-                            message = "\n".join(result_lines)
-                    elif data["status"] == 404:
-                        message = f"❌ **{word}**: 找不到用法"
-                    else:
-                        message = f"❌ **{word}**: 查詢失敗\n錯誤訊息: {data['error']}"
-                else:
-                    message = f"❌ **{word}**: 查詢失敗，錯誤代碼 {response.status}"
+            data = await api.usage_query(word, site)
+            if data["status"] == 200:
+                items: list[dict[str, str]] = data["result"]
+                if len(items) == 1:
+                    message = f"📚 **{items[0]['word']}**: {items[0]['url']}"
+                elif len(items) > 1:
+                    result_lines = [f"📚 **{word}**:"]
+                    for item in items:
+                        result_lines.append(f"- {item['word']}: {item['url']}")
+                    message = "\n".join(result_lines)
+                await usage_cache.set(f"{site}:{word}", message)
+                WORD_INDEX.add(word)
+            elif data["status"] == 404:
+                message = f"❌ **{word}**: 找不到用法"
+            else:
+                message = f"❌ **{word}**: 查詢失敗\n錯誤訊息: {data['error']}"
             return message
+        except ApiStatusError as e:
+            return f"❌ **{word}**: 查詢失敗，錯誤代碼 {e.status}"
+        except CircuitOpenError as e:
+            return (
+                f"❌ **{word}**: 查詢服務暫時無法使用，"
+                f"請在 {math.ceil(e.retry_after)} 秒後再試"
+            )
         except Exception as e:
             print(f"usage_query error for '{word}': {e}")
             return f"❌ **{word}**: 發生錯誤"
 
     try:
-        # Process all words concurrently
-        tasks = [query_single_usage(word) for word in word_list]
-        results = await asyncio.gather(*tasks)
-
-        if results:
-            response_text = "\n".join(results)
-            if len(response_text) > 2000:
-                response_text = response_text[:1997] + "..."
-            await interaction.followup.send(response_text)
-        else:
-            await interaction.followup.send("❌ 找不到結果")
+        # Query all words concurrently, showing each result as it arrives
+        await stream_results(
+            interaction,
+            word_list,
+            query_single_usage,
+            pending=lambda word: f"⏳ **{word}**: 查詢中…",
+            header=notice,
+        )
     except Exception as e:
         await interaction.followup.send("❌ 發生錯誤，請稍後再試")
         print(f"usage_query general error: {e}")
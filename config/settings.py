@@ -12,6 +12,93 @@ assert API_URL, "API_URL environment variable is not set"
 
 GUILD_ID: int = 1265707637836615730
 
+# Connection pool for API_URL, shared by every cog
+API_MAX_CONNECTIONS: int = int(os.getenv("API_MAX_CONNECTIONS", "50"))
+API_CONNECTIONS_PER_HOST: int = int(os.getenv("API_CONNECTIONS_PER_HOST", "20"))
+# Seconds an idle connection is kept open for reuse
+API_KEEPALIVE_TIMEOUT: float = float(os.getenv("API_KEEPALIVE_TIMEOUT", "30"))
+API_DNS_CACHE_TTL: int = int(os.getenv("API_DNS_CACHE_TTL", "300"))
+# Seconds to get a connection, including waiting for a free one in the pool
+API_CONNECT_TIMEOUT: float = float(os.getenv("API_CONNECT_TIMEOUT", "5"))
+# Requests to one endpoint running at the same time, the rest wait in line
+API_ENDPOINT_CONCURRENCY: int = int(os.getenv("API_ENDPOINT_CONCURRENCY", "8"))
+# Collect /dict and /usage word lookups for this many ms and send them
+# together, 0 disables batching. Without a batch endpoint path the words of
+# a batch go out as at most API_BATCH_PIPELINE concurrent requests.
+API_BATCH_WINDOW_MS: float = float(os.getenv("API_BATCH_WINDOW_MS", "0"))
+API_BATCH_MAX_SIZE: int = int(os.getenv("API_BATCH_MAX_SIZE", "32"))
+API_BATCH_PIPELINE: int = int(os.getenv("API_BATCH_PIPELINE", "8"))
+API_DICT_BATCH_PATH: str = os.getenv("API_DICT_BATCH_PATH", "")
+API_USAGE_BATCH_PATH: str = os.getenv("API_USAGE_BATCH_PATH", "")
+# Failures in a row that stop calls to an endpoint for API_BREAKER_RESET s
+API_BREAKER_FAILURES: int = int(os.getenv("API_BREAKER_FAILURES", "5"))
+API_BREAKER_RESET: float = float(os.getenv("API_BREAKER_RESET", "30"))
+# Wait for response data at most this multiple of the endpoint's recent p95
+# latency, but never less than API_MIN_READ_TIMEOUT seconds
+API_TIMEOUT_P95_FACTOR: float = float(os.getenv("API_TIMEOUT_P95_FACTOR", "3"))
+API_MIN_READ_TIMEOUT: float = float(os.getenv("API_MIN_READ_TIMEOUT", "2"))
+# Send /dict and /usage lookups slower than their p95 latency a second time
+API_HEDGE_REQUESTS: bool = os.getenv("API_HEDGE_REQUESTS", "false").lower() == "true"
+# Share of lookups that may be hedged, so a slow backend gets little extra load
+API_HEDGE_MAX_SHARE: float = float(os.getenv("API_HEDGE_MAX_SHARE", "0.1"))
+
+# Words looked up by one /dict or /usage request, duplicates count once
+MAX_WORDS_PER_QUERY: int = int(os.getenv("MAX_WORDS_PER_QUERY", "20"))
+# Per-user token bucket of words shared by /dict and /usage: up to
+# USER_WORD_BURST words at once, refilled at USER_WORD_RATE words per second
+USER_WORD_BURST: float = float(os.getenv("USER_WORD_BURST", "40"))
+USER_WORD_RATE: float = float(os.getenv("USER_WORD_RATE", "0.5"))
+
+# Caches owned by the bot that outlive /reload. With a path they are also
+# kept in a SQLite file of at most CACHE_STORE_MAX_BYTES across restarts.
+CACHE_STORE_PATH: str = os.getenv("CACHE_STORE_PATH", "cache.sqlite3")
+CACHE_STORE_MAX_BYTES: int = int(os.getenv("CACHE_STORE_MAX_BYTES", "67108864"))
+
+# Formatted /dict results, misses ("查無結果") and offline answers given
+# while the API fails expire sooner than hits
+DICT_CACHE_SIZE: int = int(os.getenv("DICT_CACHE_SIZE", "2048"))
+DICT_CACHE_TTL: float = float(os.getenv("DICT_CACHE_TTL", "86400"))
+DICT_CACHE_MISS_TTL: float = float(os.getenv("DICT_CACHE_MISS_TTL", "600"))
+
+# Word list with one word per line to seed /dict and /usage autocomplete,
+# words found by earlier lookups or kept in the cache store are suggested
+# either way
+WORD_INDEX_PATH: str = os.getenv("WORD_INDEX_PATH", "")
+
+# Found /usage links, per site and word
+USAGE_CACHE_SIZE: int = int(os.getenv("USAGE_CACHE_SIZE", "2048"))
+USAGE_CACHE_TTL: float = float(os.getenv("USAGE_CACHE_TTL", "86400"))
+
+# Offline dictionary built with `python -m utils.dict_index`, unused if empty.
+# DICT_LOOKUP_MODE picks where /dict looks first: "remote-first" uses it only
+# when the API fails, "local-first" only asks the API for words it lacks and
+# "local-only" never calls the API.
+DICT_INDEX_PATH: str = os.getenv("DICT_INDEX_PATH", "")
+DICT_LOOKUP_MODE: str = os.getenv("DICT_LOOKUP_MODE", "remote-first")
+
+# Seconds the /dict page buttons stay usable after the last click
+DICT_PAGE_TIMEOUT: float = float(os.getenv("DICT_PAGE_TIMEOUT", "300"))
+
+# Backend for /mark image rendering: "thread", "process" or "inline"
+MARK_RENDER_BACKEND: str = os.getenv("MARK_RENDER_BACKEND", "thread")
+MARK_RENDER_WORKERS: int = int(os.getenv("MARK_RENDER_WORKERS", "2"))
+# Renders running or waiting before new /mark requests are turned away
+MARK_RENDER_QUEUE_SIZE: int = int(os.getenv("MARK_RENDER_QUEUE_SIZE", "8"))
+# Long /mark texts are split into images of at most this many lines
+MARK_MAX_LINES_PER_PAGE: int = int(os.getenv("MARK_MAX_LINES_PER_PAGE", "10"))
+# Cache of MarkAccent API results
+MARK_ACCENT_CACHE_SIZE: int = int(os.getenv("MARK_ACCENT_CACHE_SIZE", "1024"))
+MARK_ACCENT_CACHE_TTL: float = float(os.getenv("MARK_ACCENT_CACHE_TTL", "604800"))
+# Offline accent index built with `python -m utils.accent_index`, unused if empty
+MARK_ACCENT_INDEX_PATH: str = os.getenv("MARK_ACCENT_INDEX_PATH", "")
+# Sentences of one /mark text sent to MarkAccent at the same time
+MARK_ACCENT_CONCURRENCY: int = int(os.getenv("MARK_ACCENT_CONCURRENCY", "4"))
+# Encoded /mark images kept in memory, bounded by total bytes
+MARK_IMAGE_CACHE_BYTES: int = int(os.getenv("MARK_IMAGE_CACHE_BYTES", "33554432"))
+MARK_IMAGE_CACHE_TTL: float = float(os.getenv("MARK_IMAGE_CACHE_TTL", "3600"))
+# zlib level (0-9) for /mark PNG output, lower is faster and larger
+MARK_PNG_COMPRESS_LEVEL: int = int(os.getenv("MARK_PNG_COMPRESS_LEVEL", "6"))
+
 
 class RoleId(Enum):
     staff = 1366967981862551593
@@ -0,0 +1,339 @@
+import asyncio
+import time
+from collections.abc import Sequence
+from typing import Any, Literal, TypedDict
+
+import aiohttp
+
+from config.settings import (
+    API_BATCH_MAX_SIZE,
+    API_BATCH_PIPELINE,
+    API_BATCH_WINDOW_MS,
+    API_BREAKER_FAILURES,
+    API_BREAKER_RESET,
+    API_CONNECT_TIMEOUT,
+    API_CONNECTIONS_PER_HOST,
+    API_DICT_BATCH_PATH,
+    API_DNS_CACHE_TTL,
+    API_ENDPOINT_CONCURRENCY,
+    API_HEDGE_MAX_SHARE,
+    API_HEDGE_REQUESTS,
+    API_KEEPALIVE_TIMEOUT,
+    API_MAX_CONNECTIONS,
+    API_MIN_READ_TIMEOUT,
+    API_TIMEOUT_P95_FACTOR,
+    API_URL,
+    API_USAGE_BATCH_PATH,
+)
+from utils.circuit_breaker import CircuitBreaker
+from utils.latency import LatencyWindow
+from utils.micro_batch import MicroBatcher
+from utils.single_flight import SingleFlight
+
+Endpoint = Literal["dict", "usage", "mark"]
+
+ENDPOINT_PATHS: dict[Endpoint, str] = {
+    "dict": "/api/DictQuery/",
+    "usage": "/api/UsageQuery/URL/",
+    "mark": "/api/MarkAccent/",
+}
+# Word lookups that can be micro-batched, and their batch endpoint if any.
+# A batch endpoint takes {"words": [...], <other fields>} and returns
+# {"status": 200, "result": [<one envelope per word, in order>]}.
+BATCH_PATHS: dict[Endpoint, str] = {
+    "dict": API_DICT_BATCH_PATH,
+    "usage": API_USAGE_BATCH_PATH,
+}
+# Idempotent lookups that may be sent a second time when slow
+HEDGED_ENDPOINTS: tuple[Endpoint, ...] = ("dict", "usage")
+# Hedges an endpoint can save up while it is fast, and send in a row later
+HEDGE_BUDGET_MAX = 10.0
+# Upper bound of seconds to wait for response data, MarkAccent parses whole
+# sentences. Once latencies are known the wait is cut to a multiple of p95.
+READ_TIMEOUTS: dict[Endpoint, float] = {
+    "dict": 10,
+    "usage": 10,
+    "mark": 20,
+}
+
+
+class ApiPayload(TypedDict, total=False):
+    """JSON envelope returned by every endpoint"""
+
+    status: int
+    result: Any
+    error: Any
+
+
+class ApiStatusError(Exception):
+    """The API answered with a non-200 HTTP status"""
+
+    def __init__(self, endpoint: Endpoint, status: int) -> None:
+        super().__init__(f"{ENDPOINT_PATHS[endpoint]} returned HTTP {status}")
+        self.endpoint = endpoint
+        self.status = status
+
+
+class CircuitOpenError(Exception):
+    """Calls to an endpoint are rejected after it kept failing"""
+
+    def __init__(self, endpoint: Endpoint, retry_after: float) -> None:
+        super().__init__(
+            f"{ENDPOINT_PATHS[endpoint]} is unavailable, retry in {retry_after:.0f} s"
+        )
+        self.endpoint = endpoint
+        self.retry_after = retry_after
+
+
+class ApiClient:
+    """One pooled aiohttp session for all API_URL calls
+
+    Concurrent calls with the same endpoint and payload share one request,
+    and at most API_ENDPOINT_CONCURRENCY requests per endpoint run at once.
+    With API_BATCH_WINDOW_MS set, word lookups arriving within the window are
+    sent together, to the batch endpoint when one is configured or else as
+    at most API_BATCH_PIPELINE concurrent requests.
+    An endpoint that keeps failing is not called for API_BREAKER_RESET
+    seconds, calls fail with CircuitOpenError instead. With
+    API_HEDGE_REQUESTS, a lookup still running the endpoint's p95 latency
+    after it got a slot is sent once more and the first answer wins. Hedges
+    are only sent while a slot is free, for at most API_HEDGE_MAX_SHARE of
+    the lookups.
+    Must be created inside the running event loop (e.g. in setup_hook).
+    """
+
+    def __init__(self, base_url: str = API_URL) -> None:
+        self.base_url = base_url.rstrip("/")
+        self.connector = aiohttp.TCPConnector(
+            limit=API_MAX_CONNECTIONS,
+            limit_per_host=API_CONNECTIONS_PER_HOST,
+            keepalive_timeout=API_KEEPALIVE_TIMEOUT,
+            ttl_dns_cache=API_DNS_CACHE_TTL,
+        )
+        self.session = aiohttp.ClientSession(connector=self.connector)
+        self.breakers = {
+            endpoint: CircuitBreaker(API_BREAKER_FAILURES, API_BREAKER_RESET)
+            for endpoint in ENDPOINT_PATHS
+        }
+        self.latency = {endpoint: LatencyWindow() for endpoint in ENDPOINT_PATHS}
+        self.hedged: dict[Endpoint, int] = dict.fromkeys(ENDPOINT_PATHS, 0)
+        self.hedge_budget: dict[Endpoint, float] = dict.fromkeys(ENDPOINT_PATHS, 0.0)
+        self.requests: dict[Endpoint, int] = dict.fromkeys(ENDPOINT_PATHS, 0)
+        self.failures: dict[Endpoint, int] = dict.fromkeys(ENDPOINT_PATHS, 0)
+        self.in_flight = 0
+        self.limits = {
+            endpoint: asyncio.Semaphore(API_ENDPOINT_CONCURRENCY)
+            for endpoint in ENDPOINT_PATHS
+        }
+        # Seconds spent waiting for a free slot, total and longest
+        self.queue_wait: dict[Endpoint, float] = dict.fromkeys(ENDPOINT_PATHS, 0.0)
+        self.queue_wait_max: dict[Endpoint, float] = dict.fromkeys(ENDPOINT_PATHS, 0.0)
+        self._single_flight: SingleFlight[
+            tuple[Endpoint, tuple[tuple[str, str], ...]], ApiPayload
+        ] = SingleFlight()
+        self._batchers: dict[
+            tuple[Endpoint, tuple[tuple[str, str], ...]], MicroBatcher[str, ApiPayload]
+        ] = {}
+
+    async def _post(self, endpoint: Endpoint, payload: dict[str, str]) -> ApiPayload:
+        key = (endpoint, tuple(sorted(payload.items())))
+        return await self._single_flight.do(
+            key, lambda: self._dispatch(endpoint, payload)
+        )
+
+    async def _dispatch(
+        self, endpoint: Endpoint, payload: dict[str, str]
+    ) -> ApiPayload:
+        if API_BATCH_WINDOW_MS <= 0 or endpoint not in BATCH_PATHS:
+            return await self._send(endpoint, payload)
+        # Lookups are batched with others that differ only in the word
+        extra = tuple(sorted((k, v) for k, v in payload.items() if k != "word"))
+        batcher = self._batchers.get((endpoint, extra))
+        if batcher is None:
+            batcher = MicroBatcher(
+                lambda words: self._send_batch(endpoint, dict(extra), words),
+                API_BATCH_WINDOW_MS / 1000,
+                API_BATCH_MAX_SIZE,
+            )
+            self._batchers[(endpoint, extra)] = batcher
+        return await batcher.submit(payload["word"])
+
+    async def _send_batch(
+        self, endpoint: Endpoint, extra: dict[str, str], words: list[str]
+    ) -> Sequence[ApiPayload | BaseException]:
+        if path := BATCH_PATHS[endpoint]:
+            data = await self._send(endpoint, {**extra, "words": words}, path)
+            if data["status"] != 200:
+                raise RuntimeError(f"Batch request failed: {data.get('error')}")
+            results: list[ApiPayload] = data["result"]
+            return results
+
+        semaphore = asyncio.Semaphore(API_BATCH_PIPELINE)
+
+        async def send_one(word: str) -> ApiPayload:
+            async with semaphore:
+                return await self._send(endpoint, {**extra, "word": word})
+
+        pipelined: list[ApiPayload | BaseException] = await asyncio.gather(
+            *(send_one(word) for word in words), return_exceptions=True
+        )
+        return pipelined
+
+    def _timeout(self, endpoint: Endpoint, adaptive: bool) -> aiohttp.ClientTimeout:
+        read = READ_TIMEOUTS[endpoint]
+        p95 = self.latency[endpoint].percentile(0.95)
+        if adaptive and p95 is not None:
+            read = min(read, max(API_MIN_READ_TIMEOUT, p95 * API_TIMEOUT_P95_FACTOR))
+        return aiohttp.ClientTimeout(
+            total=API_CONNECT_TIMEOUT + read,
+            connect=API_CONNECT_TIMEOUT,
+            sock_read=read,
+        )
+
+    async def _send(
+        self, endpoint: Endpoint, payload: dict[str, Any], path: str | None = None
+    ) -> ApiPayload:
+        hedge_after = self.latency[endpoint].percentile(0.95)
+        if (
+            not API_HEDGE_REQUESTS
+            or path is not None
+            or endpoint not in HEDGED_ENDPOINTS
+            or hedge_after is None
+        ):
+            return await self._request(endpoint, payload, path)
+
+        # Every lookup earns a share of a hedge, each hedge spends a whole one
+        self.hedge_budget[endpoint] = min(
+            HEDGE_BUDGET_MAX, self.hedge_budget[endpoint] + API_HEDGE_MAX_SHARE
+        )
+        acquired = asyncio.Event()
+        tasks = {
+            asyncio.ensure_future(self._request(endpoint, payload, acquired=acquired))
+        }
+        # The timer starts once the request holds a slot, as time spent queued
+        # for one says nothing about how slow the backend is
+        slot = asyncio.ensure_future(acquired.wait())
+        try:
+            await asyncio.wait({*tasks, slot}, return_when=asyncio.FIRST_COMPLETED)
+            done, _ = await asyncio.wait(tasks, timeout=hedge_after)
+            if not done and self._may_hedge(endpoint):
+                self.hedge_budget[endpoint] -= 1
+                self.hedged[endpoint] += 1
+                tasks.add(asyncio.ensure_future(self._request(endpoint, payload)))
+            errors: list[BaseException] = []
+            while tasks:
+                done, tasks = await asyncio.wait(
+                    tasks, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    if (error := task.exception()) is None:
+                        return task.result()
+                    errors.append(error)
+            raise errors[0]
+        finally:
+            slot.cancel()
+            # The slower request is no longer needed
+            for task in tasks:
+                task.cancel()
+
+    def _may_hedge(self, endpoint: Endpoint) -> bool:
+        # A hedge that has to queue for a slot only adds to the backlog
+        return self.hedge_budget[endpoint] >= 1 and not self.limits[endpoint].locked()
+
+    async def _request(
+        self,
+        endpoint: Endpoint,
+        payload: dict[str, Any],
+        path: str | None = None,
+        acquired: asyncio.Event | None = None,
+    ) -> ApiPayload:
+        """Send one request, setting ``acquired`` once it holds a slot"""
+        breaker = self.breakers[endpoint]
+        if not breaker.allow():
+            raise CircuitOpenError(endpoint, breaker.retry_after())
+        start = time.perf_counter()
+        async with self.limits[endpoint]:
+            if acquired is not None:
+                acquired.set()
+            waited = time.perf_counter() - start
+            self.queue_wait[endpoint] += waited
+            self.queue_wait_max[endpoint] = max(self.queue_wait_max[endpoint], waited)
+            self.requests[endpoint] += 1
+            self.in_flight += 1
+            sent = time.perf_counter()
+            try:
+                async with self.session.post(
+                    self.base_url + (path or ENDPOINT_PATHS[endpoint]),
+                    json=payload,
+                    timeout=self._timeout(endpoint, adaptive=path is None),
+                ) as response:
+                    if response.status != 200:
+                        raise ApiStatusError(endpoint, response.status)
+                    data: ApiPayload = await response.json()
+            except ApiStatusError as e:
+                self.failures[endpoint] += 1
+                # Only server errors say the backend is unhealthy
+                if e.status >= 500:
+                    breaker.record_failure()
+                else:
+                    breaker.record_success()
+                raise
+            except Exception as e:
+                self.failures[endpoint] += 1
+                breaker.record_failure()
+                # Timeouts count as latency, so a slower backend raises the cut
+                if isinstance(e, asyncio.TimeoutError) and path is None:
+                    self.latency[endpoint].add(time.perf_counter() - sent)
+                raise
+            finally:
+                self.in_flight -= 1
+            if path is None:
+                self.latency[endpoint].add(time.perf_counter() - sent)
+            breaker.record_success()
+            return data
+
+    async def dict_query(self, word: str) -> ApiPayload:
+        return await self._post("dict", {"word": word})
+
+    async def usage_query(self, word: str, site: Literal["NLB", "NLT"]) -> ApiPayload:
+        return await self._post("usage", {"word": word, "site": site})
+
+    async def mark_accent(self, text: str) -> ApiPayload:
+        return await self._post("mark", {"text": text})
+
+    def stats(self) -> dict[str, Any]:
+        # Pool occupancy comes from connector internals, so it is best effort
+        acquired = len(getattr(self.connector, "_acquired", ()))
+        idle = sum(map(len, getattr(self.connector, "_conns", {}).values()))
+        return {
+            "limit": self.connector.limit,
+            "limit_per_host": self.connector.limit_per_host,
+            "acquired": acquired,
+            "idle": idle,
+            "in_flight": self.in_flight,
+            "coalesced": self._single_flight.shared,
+            "batches": sum(b.batches for b in self._batchers.values()),
+            "batched": sum(b.items for b in self._batchers.values()),
+            "requests": dict(self.requests),
+            "breakers": {
+                endpoint: breaker.state for endpoint, breaker in self.breakers.items()
+            },
+            "breaker_rejected": sum(b.rejected for b in self.breakers.values()),
+            "hedged": dict(self.hedged),
+            "p95_ms": {
+                endpoint: 1000 * p95
+                for endpoint, window in self.latency.items()
+                if (p95 := window.percentile(0.95)) is not None
+            },
+            "failures": dict(self.failures),
+            "queue_wait_avg_ms": {
+                endpoint: 1000 * wait / max(self.requests[endpoint], 1)
+                for endpoint, wait in self.queue_wait.items()
+            },
+            "queue_wait_max_ms": {
+                endpoint: 1000 * wait for endpoint, wait in self.queue_wait_max.items()
+            },
+        }
+
+    async def close(self) -> None:
+        await self.session.close()
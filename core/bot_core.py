@@ -1,20 +1,43 @@
+import asyncio
 from typing import Any
 
-import aiohttp
 from discord.ext import commands
 
 from config.googlesheet import get_user_mapping
-from config.settings import COGS
+from config.settings import COGS, WORD_INDEX_PATH
+from core.api_client import ApiClient
+from core.cache_store import CacheStore
+from core.offline_index import close_offline_indexes
+from utils.word_index import WORD_INDEX
 
 
 class KumaBot(commands.Bot):
-    session: aiohttp.ClientSession
+    api: ApiClient
+    cache: CacheStore
     user_mapping: dict[str, dict[str, str]]
 
     def __init__(self, *args: Any, **kwargs: Any) -> None:
         super().__init__(*args, **kwargs)
 
     async def setup_hook(self) -> None:
+        # Open the caches first, cogs use them but never own them
+        self.cache = CacheStore()
+        await self.cache.open()
+        print(f"🗂️ Cache store opened ({self.cache.stats()['bytes']} bytes on disk)")
+
+        # Seed autocomplete, reading a large list would block the event loop
+        if WORD_INDEX_PATH:
+            try:
+                count = await asyncio.to_thread(WORD_INDEX.load, WORD_INDEX_PATH)
+                print(f"🔎 {count} words loaded for autocomplete")
+            except OSError as e:
+                print(f"⚠️ Failed to load word list {WORD_INDEX_PATH}: {e}")
+
+        # Words found before a restart are now mostly answered from the cache,
+        # so they would never reach autocomplete through a live lookup
+        count = await self.seed_word_index()
+        print(f"🔎 {count} cached words added to autocomplete")
+
         # Load cogs
         failed_cogs = []
         for cog_name in COGS:
@@ -29,17 +52,55 @@ class KumaBot(commands.Bot):
         else:
             print(f"⚠️ {len(failed_cogs)} cog(s) failed to load")
 
-        # Get aiohttp session
-        self.session = aiohttp.ClientSession()
-        print("🌐 Aiohttp session created")
+        # Get API client
+        self.api = ApiClient()
+        print("🌐 API client created")
 
-        # Get user mapping
+        # Get user mapping, falling back to the last one stored
+        sheet = self.cache.namespace("sheet")
         self.user_mapping = await get_user_mapping()
-        print(f"✅ {len(self.user_mapping)} users mapping loaded")
+        if self.user_mapping:
+            await sheet.set("user_mapping", self.user_mapping)
+            print(f"✅ {len(self.user_mapping)} users mapping loaded")
+        elif stored := await sheet.get("user_mapping"):
+            self.user_mapping = stored
+            print(f"⚠️ {len(self.user_mapping)} users mapping loaded from cache")
+        else:
+            print("⚠️ No users mapping loaded")
+
+    async def seed_word_index(self) -> int:
+        """Add the words with cached /dict entries or /usage links"""
+        # Cached "查無結果" answers have a total of 0 and are left out
+        found = await self.cache.namespace("dict").keys(
+            lambda value: isinstance(value, dict) and value.get("total", 0) > 0
+        )
+        # /usage only caches found links, keyed on "site:word"
+        usage = await self.cache.namespace("usage").keys()
+        words = found + [key.partition(":")[2] for key in usage]
+        return await asyncio.to_thread(WORD_INDEX.update, words)
 
     async def close(self) -> None:
-        """Override close to ensure aiohttp session is closed"""
-        if self.session:
-            await self.session.close()
-            print("🌐 Aiohttp session closed")
+        """Override close to ensure the API session, caches and indexes are closed"""
+        if getattr(self, "api", None):
+            stats = self.api.stats()
+            await self.api.close()
+            print(
+                f"🌐 API client closed ({sum(stats['requests'].values())} requests, "
+                f"{sum(stats['failures'].values())} failed, longest queue wait "
+                f"{max(stats['queue_wait_max_ms'].values()):.0f} ms)"
+            )
+        if getattr(self, "cache", None):
+            stats = self.cache.stats()
+            await self.cache.close()
+            for name in self.cache.namespaces:
+                print(
+                    f"🗂️ {name} cache: {stats[name]['hits']:.0f} hits / "
+                    f"{stats[name]['misses']:.0f} misses "
+                    f"({stats[name]['hit_rate']:.0%} hit rate)"
+                )
+            print(
+                f"🗂️ Cache store closed ({stats['bytes']} bytes on disk, "
+                f"{stats['evicted']} evicted)"
+            )
+        close_offline_indexes()
         await super().close()
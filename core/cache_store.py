@@ -0,0 +1,251 @@
+import asyncio
+import json
+import sqlite3
+import threading
+import time
+from collections.abc import Callable
+from typing import Any, Literal
+
+from config.settings import (
+    CACHE_STORE_MAX_BYTES,
+    CACHE_STORE_PATH,
+    DICT_CACHE_SIZE,
+    DICT_CACHE_TTL,
+    MARK_ACCENT_CACHE_SIZE,
+    MARK_ACCENT_CACHE_TTL,
+    USAGE_CACHE_SIZE,
+    USAGE_CACHE_TTL,
+)
+from utils.cache import TTLCache
+
+Namespace = Literal["dict", "usage", "mark", "sheet"]
+
+# Entries kept in memory and their default lifetime in seconds, per namespace.
+# Sheet data is only a fallback for when Google Sheets cannot be reached.
+NAMESPACE_LIMITS: dict[Namespace, tuple[int, float]] = {
+    "dict": (DICT_CACHE_SIZE, DICT_CACHE_TTL),
+    "usage": (USAGE_CACHE_SIZE, USAGE_CACHE_TTL),
+    "mark": (MARK_ACCENT_CACHE_SIZE, MARK_ACCENT_CACHE_TTL),
+    "sheet": (16, 30 * 86400),
+}
+# Least recently used rows removed at a time once the file is over its limit
+EVICT_BATCH = 64
+
+
+class _SQLiteBackend:
+    """One SQLite table in WAL mode shared by every namespace
+
+    Rows remember when they were last read, so the least recently used ones
+    are evicted first once their total size passes ``max_bytes``. Methods
+    block and are run in a worker thread by CacheStore.
+    """
+
+    def __init__(self, path: str, max_bytes: int) -> None:
+        self.path = path
+        self.max_bytes = max_bytes
+        self.total = 0
+        self.evicted = 0
+        self._lock = threading.Lock()
+        self._conn: sqlite3.Connection | None = None
+
+    def open(self) -> None:
+        with self._lock:
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            # Readers do not block the writer, and commits skip the fsync
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache (namespace TEXT NOT NULL, "
+                "key TEXT NOT NULL, value TEXT NOT NULL, expires REAL NOT NULL, "
+                "accessed REAL NOT NULL, size INTEGER NOT NULL, "
+                "PRIMARY KEY (namespace, key))"
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS cache_accessed ON cache (accessed)"
+            )
+            conn.execute("DELETE FROM cache WHERE expires <= ?", (time.time(),))
+            conn.commit()
+            self.total = conn.execute(
+                "SELECT COALESCE(SUM(size), 0) FROM cache"
+            ).fetchone()[0]
+            self._conn = conn
+
+    def get(self, namespace: str, key: str) -> tuple[Any, float] | None:
+        """Stored value and its expiry time, None if missing or expired"""
+        with self._lock:
+            if self._conn is None:
+                return None
+            row = self._conn.execute(
+                "SELECT value, expires, size FROM cache "
+                "WHERE namespace = ? AND key = ?",
+                (namespace, key),
+            ).fetchone()
+            if row is None:
+                return None
+            now = time.time()
+            if row[1] <= now:
+                self._conn.execute(
+                    "DELETE FROM cache WHERE namespace = ? AND key = ?",
+                    (namespace, key),
+                )
+                self.total -= row[2]
+            else:
+                self._conn.execute(
+                    "UPDATE cache SET accessed = ? WHERE namespace = ? AND key = ?",
+                    (now, namespace, key),
+                )
+            self._conn.commit()
+            return None if row[1] <= now else (json.loads(row[0]), row[1])
+
+    def set(self, namespace: str, key: str, value: Any, ttl: float) -> None:
+        data = json.dumps(value, ensure_ascii=False)
+        size = len(key.encode()) + len(data.encode())
+        with self._lock:
+            if self._conn is None:
+                return
+            old = self._conn.execute(
+                "SELECT size FROM cache WHERE namespace = ? AND key = ?",
+                (namespace, key),
+            ).fetchone()
+            now = time.time()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO cache VALUES (?, ?, ?, ?, ?, ?)",
+                (namespace, key, data, now + ttl, now, size),
+            )
+            self.total += size - (old[0] if old else 0)
+            while self.total > self.max_bytes:
+                rows = self._conn.execute(
+                    "SELECT namespace, key, size FROM cache ORDER BY accessed LIMIT ?",
+                    (EVICT_BATCH,),
+                ).fetchall()
+                if not rows:
+                    break
+                self._conn.executemany(
+                    "DELETE FROM cache WHERE namespace = ? AND key = ?",
+                    [row[:2] for row in rows],
+                )
+                self.total -= sum(row[2] for row in rows)
+                self.evicted += len(rows)
+            self._conn.commit()
+
+    def keys(
+        self, namespace: str, predicate: Callable[[Any], bool] | None = None
+    ) -> list[str]:
+        """Unexpired keys, only those whose value passes ``predicate`` if given"""
+        with self._lock:
+            if self._conn is None:
+                return []
+            rows = self._conn.execute(
+                "SELECT key, value FROM cache WHERE namespace = ? AND expires > ?",
+                (namespace, time.time()),
+            )
+            return [
+                key
+                for key, value in rows
+                if predicate is None or predicate(json.loads(value))
+            ]
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+class CacheNamespace:
+    """In-memory LRU in front of the namespace's rows in the SQLite file"""
+
+    def __init__(
+        self,
+        name: Namespace,
+        backend: _SQLiteBackend | None,
+        maxsize: int,
+        ttl: float,
+    ) -> None:
+        self.name = name
+        self.backend = backend
+        self.ttl = ttl
+        self.memory: TTLCache[str, Any] = TTLCache(maxsize, ttl)
+        self.disk_hits = 0
+
+    async def get(self, key: str) -> Any:
+        if (value := self.memory.get(key)) is not None:
+            return value
+        if self.backend is None:
+            return None
+        stored = await asyncio.to_thread(self.backend.get, self.name, key)
+        if stored is None:
+            return None
+        value, expires = stored
+        self.disk_hits += 1
+        self.memory.set(key, value, ttl=expires - time.time())
+        return value
+
+    async def set(self, key: str, value: Any, ttl: float | None = None) -> None:
+        ttl = self.ttl if ttl is None else ttl
+        self.memory.set(key, value, ttl=ttl)
+        if self.backend is not None:
+            await asyncio.to_thread(self.backend.set, self.name, key, value, ttl)
+
+    async def keys(self, predicate: Callable[[Any], bool] | None = None) -> list[str]:
+        """Keys stored on disk, only those whose value passes ``predicate``"""
+        if self.backend is None:
+            return []
+        return await asyncio.to_thread(self.backend.keys, self.name, predicate)
+
+    def stats(self) -> dict[str, float]:
+        stats = self.memory.stats()
+        # Memory misses that were found on disk count as hits
+        hits = stats["hits"] + self.disk_hits
+        misses = stats["misses"] - self.disk_hits
+        return {
+            **stats,
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": hits / (hits + misses) if hits + misses else 0.0,
+            "disk_hits": self.disk_hits,
+        }
+
+
+class CacheStore:
+    """Caches owned by the bot, so they outlive /reload of the cogs
+
+    Values must be JSON serializable. With CACHE_STORE_PATH set they are
+    also written to a SQLite file bounded by CACHE_STORE_MAX_BYTES, so a
+    restarted bot starts with the results of the previous run. Call
+    ``open()`` inside the running event loop before use.
+    """
+
+    def __init__(
+        self, path: str = CACHE_STORE_PATH, max_bytes: int = CACHE_STORE_MAX_BYTES
+    ) -> None:
+        self.backend = _SQLiteBackend(path, max_bytes) if path else None
+        self.namespaces = {
+            name: CacheNamespace(name, self.backend, maxsize, ttl)
+            for name, (maxsize, ttl) in NAMESPACE_LIMITS.items()
+        }
+
+    async def open(self) -> None:
+        if self.backend is None:
+            return
+        try:
+            await asyncio.to_thread(self.backend.open)
+        except sqlite3.Error as e:
+            print(f"⚠️ Failed to open cache file {self.backend.path}: {e}")
+            self.backend = None
+            for namespace in self.namespaces.values():
+                namespace.backend = None
+
+    def namespace(self, name: Namespace) -> CacheNamespace:
+        return self.namespaces[name]
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "bytes": self.backend.total if self.backend else 0,
+            "evicted": self.backend.evicted if self.backend else 0,
+            **{name: ns.stats() for name, ns in self.namespaces.items()},
+        }
+
+    async def close(self) -> None:
+        if self.backend is not None:
+            await asyncio.to_thread(self.backend.close)
@@ -11,22 +11,26 @@ def setup_context_menu(bot: KumaBot) -> None:
     async def dict_query_context_menu(
         interaction: Interaction, message: Message
     ) -> None:
-        await dict_query_handler(interaction, message.content, bot.session)
+        await dict_query_handler(interaction, message.content, bot.api, bot.cache)
 
     @bot.tree.context_menu(name="查詢NLB用法")
     async def usage_query_nlb_context_menu(
         interaction: Interaction, message: Message
     ) -> None:
-        await usage_query_handler(interaction, message.content, "NLB", bot.session)
+        await usage_query_handler(
+            interaction, message.content, "NLB", bot.api, bot.cache
+        )
 
     @bot.tree.context_menu(name="查詢NLT用法")
     async def usage_query_nlt_context_menu(
         interaction: Interaction, message: Message
     ) -> None:
-        await usage_query_handler(interaction, message.content, "NLT", bot.session)
+        await usage_query_handler(
+            interaction, message.content, "NLT", bot.api, bot.cache
+        )
 
     @bot.tree.context_menu(name="標記日文假名和音調")
     async def mark_text_context_menu(
         interaction: Interaction, message: Message
     ) -> None:
-        await mark_text_handler(interaction, message.content, bot.session)
+        await mark_text_handler(interaction, message.content, bot.api, bot.cache)
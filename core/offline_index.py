@@ -0,0 +1,47 @@
+"""Offline indexes shared by the cogs and the context menus.
+
+bot.py imports the cogs through core.context_menu and load_extension executes
+them again, so an index opened by a cog module was opened twice and the
+context menu's copy never closed. Each index is opened here once, on first
+import, and closed by KumaBot.close().
+"""
+
+import sqlite3
+
+from config.settings import DICT_INDEX_PATH, MARK_ACCENT_INDEX_PATH
+from utils.accent_index import AccentIndex
+from utils.dict_index import DictIndex
+
+
+def _open_accent_index(path: str) -> AccentIndex | None:
+    if not path:
+        return None
+    try:
+        return AccentIndex(path)
+    except (OSError, ValueError) as e:
+        print(f"⚠️ Failed to open accent index {path}: {e}")
+        return None
+
+
+def _open_dict_index(path: str) -> DictIndex | None:
+    if not path:
+        return None
+    try:
+        return DictIndex(path)
+    except (sqlite3.Error, ValueError) as e:
+        print(f"⚠️ Failed to open dictionary index {path}: {e}")
+        return None
+
+
+# Words found here are resolved locally, only the rest goes to MarkAccent
+ACCENT_INDEX = _open_accent_index(MARK_ACCENT_INDEX_PATH)
+# Offline dictionary entries, used as DICT_LOOKUP_MODE says
+DICT_INDEX = _open_dict_index(DICT_INDEX_PATH)
+
+
+def close_offline_indexes() -> None:
+    """Release the indexes, only once the bot no longer answers commands"""
+    if ACCENT_INDEX is not None:
+        ACCENT_INDEX.close()
+    if DICT_INDEX is not None:
+        DICT_INDEX.close()
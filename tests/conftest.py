@@ -0,0 +1,55 @@
+import os
+from pathlib import Path
+
+import pytest
+
+from utils.dict_index import build_index
+
+# config.settings and config.googlesheet refuse to import without these
+for name in (
+    "BOT_TOKEN",
+    "API_URL",
+    "GOOGLESHEET_ID",
+    "GOOGLESHEET_PRIVATE_KEY",
+    "GOOGLESHEET_PRIVATE_KEY_ID",
+    "GOOGLESHEET_CLIENT_ID",
+):
+    os.environ.setdefault(name, "test")
+
+
+# A few JMdict entries: two words read ねこ, only the second one common
+JMDICT_SAMPLE = """<?xml version="1.0" encoding="UTF-8"?>
+<!DOCTYPE JMdict [
+<!ENTITY n "noun (common) (futsuumeishi)">
+<!ENTITY v5u "Godan verb with 'u' ending">
+]>
+<JMdict>
+<entry><ent_seq>1</ent_seq>
+<k_ele><keb>寝子</keb></k_ele><r_ele><reb>ねこ</reb></r_ele>
+<sense><pos>&n;</pos><gloss>sleeping child</gloss></sense>
+</entry>
+<entry><ent_seq>2</ent_seq>
+<k_ele><keb>猫</keb><ke_pri>ichi1</ke_pri></k_ele><r_ele><reb>ねこ</reb></r_ele>
+<sense><pos>&n;</pos><gloss>cat</gloss><gloss xml:lang="ger">Katze</gloss></sense>
+<sense><gloss>shamisen</gloss></sense>
+</entry>
+<entry><ent_seq>3</ent_seq>
+<k_ele><keb>買う</keb><ke_pri>news1</ke_pri></k_ele><r_ele><reb>かう</reb></r_ele>
+<sense><pos>&v5u;</pos><gloss>to buy</gloss></sense>
+</entry>
+<entry><ent_seq>4</ent_seq>
+<r_ele><reb>ザ・ドア</reb></r_ele>
+<sense><pos>&n;</pos><gloss>"the door" (quoted)</gloss></sense>
+</entry>
+</JMdict>
+"""
+
+
+@pytest.fixture
+def dict_index_path(tmp_path: Path) -> str:
+    """An index file built from JMDICT_SAMPLE"""
+    source = tmp_path / "JMdict_e.xml"
+    source.write_text(JMDICT_SAMPLE, encoding="utf-8")
+    dest = str(tmp_path / "dict_index.sqlite3")
+    build_index(str(source), dest)
+    return dest
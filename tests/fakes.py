@@ -0,0 +1,39 @@
+"""Stand-ins for the parts of discord.Interaction the commands use"""
+
+from typing import Any
+
+
+class FakeResponse:
+    def __init__(self, interaction: "FakeInteraction") -> None:
+        self.interaction = interaction
+
+    async def defer(self, **kwargs: Any) -> None:
+        self.interaction.sent.append(("defer", None, kwargs))
+
+    async def send_message(self, content: str, **kwargs: Any) -> None:
+        self.interaction.sent.append(("response", content, kwargs))
+
+
+class FakeFollowup:
+    def __init__(self, interaction: "FakeInteraction") -> None:
+        self.interaction = interaction
+
+    async def send(self, content: str, **kwargs: Any) -> None:
+        self.interaction.sent.append(("followup", content, kwargs))
+
+
+class FakeUser:
+    id = 1
+
+
+class FakeInteraction:
+    """Records what the command sends, in order"""
+
+    def __init__(self) -> None:
+        self.user = FakeUser()
+        self.response = FakeResponse(self)
+        self.followup = FakeFollowup(self)
+        self.sent: list[tuple[str, str | None, dict[str, Any]]] = []
+
+    async def edit_original_response(self, content: str, **kwargs: Any) -> None:
+        self.sent.append(("edit", content, kwargs))
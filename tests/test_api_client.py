@@ -0,0 +1,109 @@
+import asyncio
+from collections.abc import Awaitable, Callable
+from typing import Any
+
+import pytest
+
+import core.api_client as api_client
+from core.api_client import ApiClient, ApiPayload, Endpoint
+
+# p95 latency of the seeded window, so lookups slower than this are hedged
+P95 = 0.02
+SLOW = 0.3
+
+
+@pytest.fixture(autouse=True)
+def hedging(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(api_client, "API_HEDGE_REQUESTS", True)
+    monkeypatch.setattr(api_client, "API_HEDGE_MAX_SHARE", 1.0)
+
+
+def run_client(
+    delays: list[float],
+    test: Callable[[ApiClient, list[float]], Awaitable[None]],
+    slots: int = 8,
+) -> None:
+    """Run ``test`` against a client whose requests take ``delays`` in turn
+
+    Each fake request answers with the delay it took, in an endpoint slot
+    like the real one.
+    """
+
+    async def run() -> None:
+        client = ApiClient("http://api.invalid")
+        client.limits["dict"] = asyncio.Semaphore(slots)
+        for _ in range(50):
+            client.latency["dict"].add(P95)
+        started: list[float] = []
+
+        async def request(
+            endpoint: Endpoint,
+            payload: dict[str, Any],
+            path: str | None = None,
+            acquired: asyncio.Event | None = None,
+        ) -> ApiPayload:
+            async with client.limits[endpoint]:
+                if acquired is not None:
+                    acquired.set()
+                delay = delays.pop(0)
+                started.append(delay)
+                await asyncio.sleep(delay)
+                return {"status": 200, "result": delay, "error": None}
+
+        setattr(client, "_request", request)
+        try:
+            await test(client, started)
+        finally:
+            await client.close()
+
+    asyncio.run(run())
+
+
+def test_slow_lookup_is_hedged() -> None:
+    async def test(client: ApiClient, started: list[float]) -> None:
+        data = await client.dict_query("猫")
+        # The second request answered first, the slow one was cancelled
+        assert data["result"] == 0
+        assert started == [SLOW, 0]
+        assert client.hedged["dict"] == 1
+
+    run_client([SLOW, 0], test)
+
+
+def test_time_queued_for_a_slot_is_not_hedged() -> None:
+    async def test(client: ApiClient, started: list[float]) -> None:
+        # Another lookup holds the only slot for longer than p95
+        await client.limits["dict"].acquire()
+        loop = asyncio.get_running_loop()
+        loop.call_later(5 * P95, client.limits["dict"].release)
+
+        data = await client.dict_query("猫")
+        assert data["result"] == 0.001
+        assert client.hedged["dict"] == 0
+
+    run_client([0.001], test, slots=1)
+
+
+def test_no_hedge_while_slots_are_taken() -> None:
+    async def test(client: ApiClient, started: list[float]) -> None:
+        data = await client.dict_query("猫")
+        # A hedge would only have queued behind the slow request
+        assert data["result"] == 5 * P95
+        assert client.hedged["dict"] == 0
+
+    run_client([5 * P95], test, slots=1)
+
+
+def test_hedges_are_capped_to_a_share_of_lookups(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.setattr(api_client, "API_HEDGE_MAX_SHARE", 0.5)
+
+    async def test(client: ApiClient, started: list[float]) -> None:
+        for word in "一二三四":
+            await client.dict_query(word)
+        # Every second slow lookup has earned a hedge
+        assert client.hedged["dict"] == 2
+        assert started == [SLOW, SLOW, 0, SLOW, SLOW, 0]
+
+    run_client([SLOW, SLOW, 0, SLOW, SLOW, 0], test)
@@ -0,0 +1,92 @@
+from types import SimpleNamespace
+
+import pytest
+
+import utils.circuit_breaker as circuit_breaker
+from utils.circuit_breaker import CircuitBreaker
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 1000.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch: pytest.MonkeyPatch) -> FakeClock:
+    fake = FakeClock()
+    monkeypatch.setattr(
+        circuit_breaker, "time", SimpleNamespace(monotonic=fake.monotonic)
+    )
+    return fake
+
+
+def state_of(breaker: CircuitBreaker) -> str:
+    # A function call keeps mypy from narrowing the state between calls
+    # that change it
+    return breaker.state
+
+
+def test_breaker_opens_probes_and_closes(clock: FakeClock) -> None:
+    breaker = CircuitBreaker(threshold=3, reset_timeout=30)
+    for _ in range(2):
+        assert breaker.allow()
+        breaker.record_failure()
+    assert breaker.failures == 2
+    # A success in between starts the count again
+    breaker.record_success()
+    for _ in range(3):
+        assert breaker.allow()
+        breaker.record_failure()
+    assert state_of(breaker) == "open"
+    assert breaker.trips == 1
+
+    clock.now += 10
+    assert not breaker.allow()
+    assert breaker.retry_after() == 20
+
+    # After the reset timeout a single probe goes through
+    clock.now += 20
+    assert breaker.allow()
+    assert state_of(breaker) == "half_open"
+    assert not breaker.allow()
+    assert breaker.rejected == 2
+
+    breaker.record_success()
+    assert state_of(breaker) == "closed"
+    assert breaker.allow()
+    assert breaker.retry_after() == 0
+
+
+def test_failed_probe_opens_the_breaker_again(clock: FakeClock) -> None:
+    breaker = CircuitBreaker(threshold=1, reset_timeout=30)
+    breaker.record_failure()
+    clock.now += 30
+    assert breaker.allow()
+
+    breaker.record_failure()
+    assert state_of(breaker) == "open"
+    assert breaker.trips == 2
+    # The wait starts over from the failed probe
+    clock.now += 29
+    assert not breaker.allow()
+    clock.now += 1
+    assert breaker.allow()
+
+
+def test_lost_probe_is_replaced(clock: FakeClock) -> None:
+    breaker = CircuitBreaker(threshold=1, reset_timeout=30)
+    breaker.record_failure()
+    clock.now += 30
+    # This probe never reports back, e.g. its caller was cancelled
+    assert breaker.allow()
+
+    clock.now += 29
+    assert not breaker.allow()
+    assert breaker.retry_after() == 1
+    clock.now += 1
+    assert breaker.allow()
+    assert state_of(breaker) == "half_open"
+    assert not breaker.allow()
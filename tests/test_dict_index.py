@@ -0,0 +1,42 @@
+from collections.abc import Iterator
+
+import pytest
+
+from utils.dict_index import DictIndex
+
+
+@pytest.fixture
+def index(dict_index_path: str) -> Iterator[DictIndex]:
+    opened = DictIndex(dict_index_path)
+    yield opened
+    opened.close()
+
+
+def test_build_keeps_english_glosses(index: DictIndex) -> None:
+    assert index.count == 4
+    (cat,) = index.lookup("猫")
+    assert cat == {
+        "kanji": ["猫"],
+        "furigana": ["ねこ"],
+        "definitions": [
+            {"pos": ["noun (common) (futsuumeishi)"], "meanings": ["cat"]},
+            # A sense without <pos> keeps the one before it
+            {"pos": ["noun (common) (futsuumeishi)"], "meanings": ["shamisen"]},
+        ],
+    }
+
+
+def test_exact_match_lists_common_words_first(index: DictIndex) -> None:
+    # 寝子 comes first in the dump, 猫 is marked as common
+    assert [entry["kanji"] for entry in index.lookup("ねこ")] == [["猫"], ["寝子"]]
+    assert [entry["kanji"] for entry in index.lookup(" 買う ")] == [["買う"]]
+    assert index.lookup("犬") == []
+
+
+def test_english_falls_back_to_glosses(index: DictIndex) -> None:
+    assert [entry["kanji"] for entry in index.lookup("to buy")] == [["買う"]]
+    assert [entry["furigana"] for entry in index.lookup("sleeping")] == [["ねこ"]]
+    # FTS5 syntax is matched literally, quotes included
+    assert [entry["furigana"] for entry in index.lookup('"the door"')] == [["ザ・ドア"]]
+    assert index.lookup('door" OR "cat') == []
+    assert index.lookup("NEAR(cat buy)") == []
@@ -0,0 +1,93 @@
+import asyncio
+from collections.abc import Iterator
+from typing import Any, cast
+
+import pytest
+from discord import Interaction
+
+import cogs.dict_query as dict_query
+from cogs.dict_query import fetch_dict_link, lookup_word
+from config.settings import DICT_CACHE_MISS_TTL
+from core.api_client import ApiClient, ApiPayload
+from core.cache_store import CacheStore
+from tests.fakes import FakeInteraction
+from utils.dict_index import DictIndex
+
+
+class FakeApi:
+    def __init__(self, status: int) -> None:
+        self.status = status
+
+    async def dict_query(self, word: str) -> ApiPayload:
+        if self.status != 200:
+            return {"status": self.status, "result": [], "error": {"message": "x"}}
+        item = {
+            "kanji": [word],
+            "furigana": ["ねこ"],
+            "definitions": [{"pos": ["名詞"], "meanings": ["cat"]}],
+        }
+        return {"status": 200, "result": [item], "error": None}
+
+
+@pytest.fixture
+def remote_first(
+    dict_index_path: str, monkeypatch: pytest.MonkeyPatch
+) -> Iterator[None]:
+    index = DictIndex(dict_index_path)
+    monkeypatch.setattr(dict_query, "DICT_INDEX", index)
+    monkeypatch.setattr(dict_query, "DICT_LOOKUP_MODE", "remote-first")
+    yield
+    index.close()
+
+
+def cached_ttls(api: FakeApi, words: str) -> dict[str, float | None]:
+    """TTL each word of a /dict request was cached with"""
+    ttls: dict[str, float | None] = {}
+
+    async def run() -> None:
+        cache = CacheStore(path="")
+        await cache.open()
+        namespace = cache.namespace("dict")
+        store = namespace.set
+
+        async def spy(key: str, value: Any, ttl: float | None = None) -> None:
+            ttls[key] = ttl
+            await store(key, value, ttl)
+
+        namespace.set = spy  # type: ignore[method-assign]
+        await fetch_dict_link(
+            cast(Interaction, FakeInteraction()), words, cast(ApiClient, api), cache
+        )
+
+    asyncio.run(run())
+    return ttls
+
+
+def test_lookup_reports_its_source(remote_first: None) -> None:
+    async def run(api: FakeApi, word: str) -> tuple[Any, str]:
+        return await lookup_word(cast(ApiClient, api), word)
+
+    entries, source = asyncio.run(run(FakeApi(200), "猫"))
+    assert source == "remote"
+    assert entries[0]["definitions"][0]["pos"] == ["名詞"]
+
+    entries, source = asyncio.run(run(FakeApi(500), "猫"))
+    assert source == "fallback"
+    assert entries[0]["kanji"] == ["猫"]
+
+    # Without an offline answer the API's error line is kept
+    entries, source = asyncio.run(run(FakeApi(500), "犬"))
+    assert source == "remote"
+    assert isinstance(entries, str)
+
+
+def test_fallback_answers_are_cached_briefly(remote_first: None) -> None:
+    assert cached_ttls(FakeApi(200), "猫") == {"猫": None}
+    assert cached_ttls(FakeApi(500), "猫 犬") == {"猫": DICT_CACHE_MISS_TTL}
+
+
+def test_local_first_answers_are_cached_normally(
+    remote_first: None, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr(dict_query, "DICT_LOOKUP_MODE", "local-first")
+    assert cached_ttls(FakeApi(500), "猫") == {"猫": None}
@@ -0,0 +1,119 @@
+import os
+
+import pytest
+from PIL import Image, ImageDraw
+
+import utils.mark_render as mark_render
+from utils.font_registry import FONT_REGISTRY
+from utils.glyph_atlas import GlyphAtlas
+from utils.mark_layout import MarkLayout, Token, layout_tokens
+from utils.mark_render import (
+    BASE_FONT_SIZE,
+    FONT_PATH,
+    FURI_FONT_SIZE,
+    WHITE,
+    PillowMetrics,
+    rasterize,
+)
+
+pytestmark = pytest.mark.skipif(
+    not os.path.exists(FONT_PATH), reason=f"{FONT_PATH} is not installed"
+)
+
+TEXTS: dict[str, list[Token]] = {
+    "kana": [
+        ("ひらがな", "ひらがな", [0, 1, 1, 1]),
+        ("と", "と", [1]),
+        ("カタカナ", "カタカナ", [0, 1, 2, 0]),
+        ("。", "。", [0]),
+    ],
+    "repeated_kanji": [("日本", "にほん", [0, 2, 0])] * 6
+    + [("東京", "とうきょう", [0, 1, 1, 1, 1])] * 4,
+    "furigana": [
+        ("漢字", "かんじ", [0, 1, 1]),
+        ("振", "ふ", [2]),
+        ("り", "り", [0]),
+        ("仮名", "がな", [0, 1]),
+    ],
+    "mixed": [
+        ("「", "「", [0]),
+        ("東京", "とうきょう", [0, 1, 1, 1, 1]),
+        ("タワー", "タワー", [1, 2, 0]),
+        ("は", "は", [0]),
+        ("333", "333", [0, 0, 0]),
+        ("m", "m", [0]),
+        ("です", "です", [1, 2]),
+        ("！」", "！」", [0, 0]),
+        ("今日", "きょう", [2, 0]),
+        ("も", "も", [0]),
+        ("晴", "は", [2]),
+        ("れ", "れ", [0]),
+    ]
+    * 3,
+}
+
+
+@pytest.fixture
+def atlas(monkeypatch: pytest.MonkeyPatch) -> GlyphAtlas:
+    """A fresh atlas for rasterize, so no test sees another's glyphs"""
+    fresh = GlyphAtlas()
+    monkeypatch.setattr(mark_render, "GLYPH_ATLAS", fresh)
+    return fresh
+
+
+def make_layout(tokens: list[Token]) -> MarkLayout:
+    font = FONT_REGISTRY.get(FONT_PATH, BASE_FONT_SIZE)
+    return layout_tokens(tokens, PillowMetrics(font))
+
+
+def assert_same_pixels(layout: MarkLayout) -> None:
+    expected = rasterize(layout, use_atlas=False)
+    actual = rasterize(layout, use_atlas=True)
+    assert actual.size == expected.size
+    assert actual.tobytes() == expected.tobytes()
+
+
+@pytest.mark.parametrize("name", TEXTS)
+def testrasterize_matches_pillow(name: str, atlas: GlyphAtlas) -> None:
+    assert_same_pixels(make_layout(TEXTS[name]))
+    # Drawing again from a warm atlas gives the same pixels too
+    assert_same_pixels(make_layout(TEXTS[name]))
+    # Every string went through the atlas, none fell back to ImageDraw.text
+    assert atlas.stats()["fallbacks"] == 0
+    assert atlas.stats()["hits"] > 0
+
+
+@pytest.mark.parametrize("size", [BASE_FONT_SIZE, FURI_FONT_SIZE])
+@pytest.mark.parametrize("anchor", ["lm", "mb", "la", "rs"])
+@pytest.mark.parametrize("name", TEXTS)
+def test_draw_text_matches_pillow(
+    name: str, anchor: str, size: int, atlas: GlyphAtlas
+) -> None:
+    font = FONT_REGISTRY.get(FONT_PATH, size)
+    text = "".join(surface for surface, _, _ in TEXTS[name])
+    width = int(font.getlength(text)) + 4 * size
+    # Sub-pixel positions are rounded like ImageDraw.text rounds them
+    for xy in [(2.0 * size, 1.5 * size), (2.25 * size + 0.4, 1.5 * size + 0.7)]:
+        expected = Image.new("RGBA", (width, 3 * size), (0, 0, 0, 0))
+        ImageDraw.Draw(expected).text(xy, text, fill=WHITE, font=font, anchor=anchor)
+        actual = Image.new("RGBA", (width, 3 * size), (0, 0, 0, 0))
+        atlas.draw_text(actual, xy, text, font, WHITE, anchor=anchor)
+        assert actual.tobytes() == expected.tobytes()
+
+
+def testrasterize_after_kanji_eviction(monkeypatch: pytest.MonkeyPatch) -> None:
+    small = GlyphAtlas(kanji_capacity=4)
+    monkeypatch.setattr(mark_render, "GLYPH_ATLAS", small)
+    first = make_layout(TEXTS["mixed"])
+    second = make_layout(TEXTS["furigana"] + TEXTS["repeated_kanji"])
+
+    assert_same_pixels(first)
+    assert small.stats()["kanji"] == 4
+    # The second text pushes the first one's kanji out of the atlas
+    assert_same_pixels(second)
+    assert small.stats()["kanji"] == 4
+    misses = small.stats()["misses"]
+    # so drawing the first again renders them once more, with the same pixels
+    assert_same_pixels(first)
+    assert small.stats()["misses"] > misses
+    assert small.stats()["kanji"] == 4
@@ -0,0 +1,138 @@
+import asyncio
+from collections.abc import Iterator
+from pathlib import Path
+from typing import cast
+
+import pytest
+
+import cogs.mark_text as mark_text
+from cogs.mark_text import get_furigana_via_api, split_sentences
+from core.api_client import ApiClient, ApiPayload, CircuitOpenError
+from core.cache_store import CacheStore
+from utils.accent_index import AccentIndex, build_index
+from utils.mark_layout import Token
+
+
+@pytest.mark.parametrize(
+    ("text", "sentences"),
+    [
+        ("今日は晴れ。明日も", ["今日は晴れ。", "明日も"]),
+        ("本当？！そう。\n次", ["本当？！", "そう。\n", "次"]),
+        ("「行く。」と言った。", ["「行く。」", "と言った。"]),
+        ("（はい。）」次！", ["（はい。）」", "次！"]),
+        ("「本」を読む。", ["「本」を読む。"]),
+    ],
+)
+def test_split_sentences(text: str, sentences: list[str]) -> None:
+    assert split_sentences(text) == sentences
+    assert "".join(sentences) == text
+
+
+class FakeApi:
+    """Answers MarkAccent with one token per character, and records calls"""
+
+    def __init__(
+        self, answers: dict[str, ApiPayload | Exception] | None = None
+    ) -> None:
+        self.answers = answers or {}
+        self.calls: list[str] = []
+
+    async def mark_accent(self, text: str) -> ApiPayload:
+        self.calls.append(text)
+        answer = self.answers.get(text)
+        if isinstance(answer, Exception):
+            raise answer
+        if answer is not None:
+            return answer
+        items = [
+            {"surface": c, "furigana": c, "accent": [{"accent_marking_type": 1}]}
+            for c in text
+        ]
+        return {"status": 200, "result": items, "error": None}
+
+
+@pytest.fixture
+def accent_index(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> Iterator[AccentIndex]:
+    dump = tmp_path / "accents.txt"
+    dump.write_text("日本語\tにほんご\t0\n勉強\tべんきょう\t0\n東京\tとうきょう\t0\n")
+    build_index(str(dump), str(tmp_path / "accent_index.bin"))
+    index = AccentIndex(str(tmp_path / "accent_index.bin"))
+    monkeypatch.setattr(mark_text, "ACCENT_INDEX", index)
+    yield index
+    index.close()
+
+
+def lookup(text: str, api: FakeApi, complete: bool = True) -> list[Token]:
+    async def run() -> tuple[list[Token], bool]:
+        cache = CacheStore(path="")
+        await cache.open()
+        return await get_furigana_via_api(text, cast(ApiClient, api), cache)
+
+    tokens, answered = asyncio.run(run())
+    assert answered is complete
+    return tokens
+
+
+def test_mixed_text_sends_whole_sentences(accent_index: AccentIndex) -> None:
+    api = FakeApi()
+    tokens = lookup("日本語を勉強します。東京、日本語。", api)
+
+    # Only the sentence with unindexed words goes out, in one piece
+    assert api.calls == ["日本語を勉強します。"]
+    assert [surface for surface, _, _ in tokens] == [
+        *"日本語を勉強します。",
+        "東京",
+        "、",
+        "日本語",
+        "。",
+    ]
+    assert tokens[-4:] == [
+        ("東京", "とうきょう", [0, 1, 1, 1, 1]),
+        ("、", "、", [0]),
+        ("日本語", "にほんご", [0, 1, 1, 1]),
+        ("。", "。", [0]),
+    ]
+
+
+def test_empty_answer_is_not_a_failure(accent_index: AccentIndex) -> None:
+    api = FakeApi({"ね。": {"status": 200, "result": [], "error": None}})
+    tokens = lookup("東京へ行く。ね。", api)
+
+    assert api.calls == ["東京へ行く。", "ね。"]
+    assert "".join(surface for surface, _, _ in tokens) == "東京へ行く。"
+
+
+DOWN: ApiPayload = {"status": 500, "result": [], "error": "down"}
+
+
+@pytest.mark.parametrize(
+    "failure", [DOWN, CircuitOpenError("mark", 30)], ids=["error", "open"]
+)
+def test_failed_sentence_falls_back_to_the_index(
+    failure: ApiPayload | Exception, accent_index: AccentIndex
+) -> None:
+    api = FakeApi({"東京へ行く。": failure})
+    tokens = lookup("東京へ行く。勉強です。", api, complete=False)
+
+    # Indexed words keep their readings, the rest is drawn without any
+    assert tokens[:2] == [
+        ("東京", "とうきょう", [0, 1, 1, 1, 1]),
+        ("へ行く。", "へ行く。", [0, 0, 0, 0]),
+    ]
+    # The other sentence still gets the API's answer
+    assert [surface for surface, _, _ in tokens[2:]] == [*"勉強です。"]
+
+
+def test_failed_sentence_without_index_fails_the_text(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.setattr(mark_text, "ACCENT_INDEX", None)
+
+    assert lookup("東京へ行く。", FakeApi({"東京へ行く。": DOWN}), False) == []
+    with pytest.raises(CircuitOpenError):
+        lookup(
+            "東京へ行く。",
+            FakeApi({"東京へ行く。": CircuitOpenError("mark", 30)}),
+        )
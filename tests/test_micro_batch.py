@@ -0,0 +1,43 @@
+import asyncio
+
+import pytest
+
+from utils.micro_batch import MicroBatcher
+
+
+def test_batch_results_reach_their_callers() -> None:
+    async def run() -> list[str]:
+        async def dispatch(items: list[int]) -> list[str | BaseException]:
+            return [ValueError(n) if n < 0 else str(n) for n in items]
+
+        batcher = MicroBatcher(dispatch, window=0.01, max_size=8)
+        results = await asyncio.gather(
+            *(batcher.submit(n) for n in (1, -1, 2)), return_exceptions=True
+        )
+        assert batcher.batches == 1
+        return [r if isinstance(r, str) else type(r).__name__ for r in results]
+
+    assert asyncio.run(run()) == ["1", "ValueError", "2"]
+
+
+def test_cancelled_batch_cancels_callers() -> None:
+    async def run() -> None:
+        started = asyncio.Event()
+
+        async def dispatch(items: list[int]) -> list[str | BaseException]:
+            started.set()
+            await asyncio.sleep(60)
+            return []
+
+        batcher = MicroBatcher(dispatch, window=0.01, max_size=8)
+        callers = [asyncio.create_task(batcher.submit(n)) for n in range(3)]
+        await started.wait()
+        for task in batcher._tasks:
+            task.cancel()
+        done, _ = await asyncio.wait(callers, timeout=1)
+        assert len(done) == 3
+        for caller in callers:
+            with pytest.raises(asyncio.CancelledError):
+                caller.result()
+
+    asyncio.run(run())
@@ -0,0 +1,71 @@
+import asyncio
+from typing import cast
+
+import pytest
+from discord import Interaction
+
+import utils.query_words as query_words
+from cogs.usage_query import fetch_usage
+from config.settings import MAX_WORDS_PER_QUERY
+from core.api_client import ApiClient, ApiPayload
+from core.cache_store import CacheStore
+from tests.fakes import FakeInteraction
+from utils.rate_limit import TokenBucket
+
+
+class FakeApi:
+    def __init__(self) -> None:
+        self.words: list[str] = []
+
+    async def usage_query(self, word: str, site: str) -> ApiPayload:
+        self.words.append(word)
+        result = [{"word": word, "url": f"https://example.com/{word}"}]
+        return {"status": 200, "result": result, "error": None}
+
+
+@pytest.fixture(autouse=True)
+def fresh_limiter(monkeypatch: pytest.MonkeyPatch) -> None:
+    bucket = TokenBucket(0.01, MAX_WORDS_PER_QUERY)
+    monkeypatch.setattr(query_words, "WORD_RATE_LIMITER", bucket)
+
+
+def run_usage(words: str) -> tuple[FakeInteraction, FakeApi]:
+    interaction = FakeInteraction()
+    api = FakeApi()
+
+    async def run() -> None:
+        cache = CacheStore(path="")
+        await cache.open()
+        await fetch_usage(
+            cast(Interaction, interaction), words, "NLB", cast(ApiClient, api), cache
+        )
+
+    asyncio.run(run())
+    return interaction, api
+
+
+def test_word_cap_notice_is_part_of_the_reply() -> None:
+    words = [f"語{n}" for n in range(MAX_WORDS_PER_QUERY + 5)]
+    interaction, api = run_usage(" ".join(words))
+
+    assert sorted(api.words) == sorted(words[:MAX_WORDS_PER_QUERY])
+    kinds = [kind for kind, _, _ in interaction.sent]
+    # The deferred response is the first message, nothing is sent before it
+    assert kinds[0] == "defer"
+    assert "followup" not in kinds
+    _, content, _ = interaction.sent[-1]
+    assert content is not None
+    assert content.startswith(f"⚠️ 一次最多查詢 {MAX_WORDS_PER_QUERY} 個單字")
+    assert f"共 {len(words)} 個" in content
+
+
+def test_rate_limited_user_gets_an_ephemeral_reply() -> None:
+    run_usage(" ".join(f"語{n}" for n in range(MAX_WORDS_PER_QUERY)))
+    interaction, api = run_usage("もう一つ")
+
+    assert api.words == []
+    assert len(interaction.sent) == 1
+    kind, content, kwargs = interaction.sent[0]
+    assert kind == "response"
+    assert content is not None and content.startswith("⏳ 查詢太頻繁")
+    assert kwargs == {"ephemeral": True}
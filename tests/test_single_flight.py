@@ -0,0 +1,65 @@
+import asyncio
+
+import pytest
+
+from utils.single_flight import SingleFlight
+
+
+def test_cancelled_caller_leaves_the_call_running() -> None:
+    async def run() -> None:
+        flight: SingleFlight[str, str] = SingleFlight()
+        started = asyncio.Event()
+        release = asyncio.Event()
+        runs = 0
+
+        async def fetch() -> str:
+            nonlocal runs
+            runs += 1
+            started.set()
+            await release.wait()
+            return "猫"
+
+        first = asyncio.create_task(flight.do("ねこ", fetch))
+        second = asyncio.create_task(flight.do("ねこ", fetch))
+        await started.wait()
+        await asyncio.sleep(0)
+        first.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+
+        # A caller arriving after the cancel still joins the same call
+        third = asyncio.create_task(flight.do("ねこ", fetch))
+        await asyncio.sleep(0)
+        release.set()
+        assert list(await asyncio.gather(second, third)) == ["猫", "猫"]
+        assert runs == 1
+        assert (flight.calls, flight.shared) == (1, 2)
+        assert len(flight) == 0
+
+    asyncio.run(run())
+
+
+def test_error_reaches_every_caller() -> None:
+    async def run() -> None:
+        flight: SingleFlight[str, str] = SingleFlight()
+        release = asyncio.Event()
+
+        async def fetch() -> str:
+            await release.wait()
+            raise ValueError("down")
+
+        callers = [asyncio.create_task(flight.do("ねこ", fetch)) for _ in range(3)]
+        await asyncio.sleep(0)
+        release.set()
+        results = await asyncio.gather(*callers, return_exceptions=True)
+        assert [type(r) for r in results] == [ValueError] * 3
+        assert flight.calls == 1
+
+        # The failed call is forgotten, so the next caller tries again
+        async def retry() -> str:
+            return "猫"
+
+        assert await flight.do("ねこ", retry) == "猫"
+        assert flight.calls == 2
+
+    asyncio.run(run())
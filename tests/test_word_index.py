@@ -0,0 +1,51 @@
+import asyncio
+from pathlib import Path
+from types import SimpleNamespace
+from typing import cast
+
+import pytest
+
+import core.bot_core as bot_core
+from core.bot_core import KumaBot
+from core.cache_store import CacheStore
+from utils.word_index import PrefixIndex
+
+
+def test_complete_prefix() -> None:
+    index = PrefixIndex()
+    assert index.update(["日本語", "日本", "にほん", " 日本 ", ""]) == 3
+    index.add("日曜日")
+
+    assert index.complete("日") == ["日曜日", "日本", "日本語"]
+    assert index.complete("日本", limit=1) == ["日本"]
+    assert index.complete("英") == []
+    assert index.complete("") == []
+
+
+def test_seed_from_cache_after_restart(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    index = PrefixIndex()
+    monkeypatch.setattr(bot_core, "WORD_INDEX", index)
+    path = str(tmp_path / "cache.sqlite3")
+
+    async def run() -> int:
+        before = CacheStore(path)
+        await before.open()
+        await before.namespace("dict").set("日本", {"entries": ["1."], "total": 1})
+        await before.namespace("dict").set("日本x", {"entries": [], "total": 0})
+        await before.namespace("usage").set("NLB:日本語", "📚 **日本語**: url")
+        await before.namespace("mark").set("日曜日", [])
+        await before.close()
+
+        # A new store only has what the previous run left on disk
+        after = CacheStore(path)
+        await after.open()
+        bot = SimpleNamespace(cache=after)
+        count = await KumaBot.seed_word_index(cast(KumaBot, bot))
+        await after.close()
+        return count
+
+    assert asyncio.run(run()) == 2
+    # Misses and other namespaces are not suggested
+    assert index.complete("日") == ["日本", "日本語"]
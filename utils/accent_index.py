@@ -0,0 +1,280 @@
+"""Offline furigana / pitch accent index for /mark.
+
+The index is a sorted array of ``surface\\tfurigana\\tmarks`` records in one
+file, memory-mapped on open. Lookups binary search the mapped records, so
+opening is instant and the dictionary never has to fit on the Python heap.
+
+File layout (little endian):
+    8 bytes  magic
+    uint32   record count N
+    uint32   longest surface, in characters
+    uint32   N + 1 record offsets, relative to the start of the records
+    bytes    UTF-8 records sorted by surface
+
+Build one from a tab separated accent dictionary dump:
+    python -m utils.accent_index accents.txt accent_index.bin
+"""
+
+import bisect
+import mmap
+import struct
+import sys
+import unicodedata
+from collections.abc import Iterable
+
+from utils.mark_layout import Token, is_kanji
+
+MAGIC = b"MKACIDX1"
+_HEADER = struct.Struct("<8sII")
+_OFFSET = struct.Struct("<I")
+
+# Small kana share a mora with the kana before them
+SMALL_KANA = "ぁぃぅぇぉゃゅょゎァィゥェォャュョヮ"
+
+
+def _is_kana(char: str) -> bool:
+    return "ぁ" <= char <= "ゟ" or "゠" <= char <= "ヿ"
+
+
+def to_hiragana(text: str) -> str:
+    return "".join(chr(ord(c) - 0x60) if "ァ" <= c <= "ヶ" else c for c in text)
+
+
+def accent_marks(reading: str, downstep: int) -> list[int]:
+    """Per-kana accent_marking_type (0 low, 1 high, 2 high then drop)
+
+    ``downstep`` is the usual accent number: 0 for heiban, otherwise the
+    mora after which the pitch falls.
+    """
+    moras: list[int] = []  # kana count of each mora
+    for char in reading:
+        if moras and char in SMALL_KANA:
+            moras[-1] += 1
+        else:
+            moras.append(1)
+
+    marks: list[int] = []
+    for idx, size in enumerate(moras, 1):
+        if downstep == 0:
+            mark = 0 if idx == 1 else 1
+        elif idx == downstep:
+            mark = 2
+        elif 1 < idx < downstep:
+            mark = 1
+        else:
+            mark = 0
+        # The line covers the whole mora, the drop comes after its last kana
+        marks.extend([1 if mark else 0] * (size - 1) + [mark])
+    return marks
+
+
+def split_okurigana(surface: str, furigana: str, marks: list[int]) -> list[Token]:
+    """Split kana around the kanji off, like MarkAccent subwords"""
+    start = 0
+    while (
+        start < len(surface) - 1
+        and start < len(furigana)
+        and _is_kana(surface[start])
+        and surface[start] == furigana[start]
+    ):
+        start += 1
+    end = 0
+    while (
+        end < len(surface) - start - 1
+        and end < len(furigana) - start
+        and _is_kana(surface[-1 - end])
+        and surface[-1 - end] == furigana[-1 - end]
+    ):
+        end += 1
+
+    tokens: list[Token] = []
+    if start:
+        tokens.append((surface[:start], surface[:start], marks[:start]))
+    middle_end = len(furigana) - end
+    tokens.append(
+        (
+            surface[start : len(surface) - end],
+            furigana[start:middle_end],
+            marks[start:middle_end],
+        )
+    )
+    if end:
+        tail = surface[len(surface) - end :]
+        tokens.append((tail, tail, marks[middle_end:]))
+    return tokens
+
+
+def _parse_dump(lines: Iterable[str]) -> dict[str, tuple[str, list[int]]]:
+    """Read ``surface<TAB>reading<TAB>accent`` lines
+
+    The accent column may list several numbers ("1,2"), the first is used.
+    Only words with kanji are kept: kana-only words are where greedy matching
+    goes wrong, and they have no furigana to look up anyway.
+    """
+    entries: dict[str, tuple[str, list[int]]] = {}
+    for line in lines:
+        fields = line.rstrip("\n").split("\t")
+        if len(fields) < 3:
+            continue
+        surface = unicodedata.normalize("NFC", fields[0].strip())
+        reading = to_hiragana(fields[1].strip() or surface)
+        accent = fields[2].strip().split(",")[0]
+        if (
+            surface in entries
+            or not any(map(is_kanji, surface))
+            or not accent.isdigit()
+            or "\t" in surface + reading
+        ):
+            continue
+        entries[surface] = (reading, accent_marks(reading, int(accent)))
+    return entries
+
+
+def build_index(source: str, dest: str) -> int:
+    """Write an index file from a dictionary dump, returns the entry count"""
+    with open(source, encoding="utf-8") as f:
+        entries = _parse_dump(f)
+
+    records = sorted(
+        (
+            surface.encode(),
+            f"{reading}\t{''.join(map(str, marks))}".encode(),
+        )
+        for surface, (reading, marks) in entries.items()
+    )
+    offsets = [0]
+    for key, value in records:
+        offsets.append(offsets[-1] + len(key) + 1 + len(value))
+    max_len = max((len(surface) for surface in entries), default=0)
+
+    with open(dest, "wb") as f:
+        f.write(_HEADER.pack(MAGIC, len(records), max_len))
+        for offset in offsets:
+            f.write(_OFFSET.pack(offset))
+        for key, value in records:
+            f.write(key + b"\t" + value)
+    return len(records)
+
+
+class _Keys:
+    """Sequence view of the record surfaces, for ``bisect``"""
+
+    def __init__(self, index: "AccentIndex") -> None:
+        self.index = index
+
+    def __len__(self) -> int:
+        return self.index.count
+
+    def __getitem__(self, i: int) -> bytes:
+        start, end = self.index._record_span(i)
+        mm = self.index._mm
+        return mm[start : mm.find(b"\t", start, end)]
+
+
+class AccentIndex:
+    """Read-only, memory-mapped view of an index built by ``build_index``"""
+
+    def __init__(self, path: str) -> None:
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, count, max_len = _HEADER.unpack_from(self._mm)
+        self.count: int = count
+        self.max_len: int = max_len
+        if magic != MAGIC:
+            self._mm.close()
+            raise ValueError(f"{path} is not an accent index")
+        self._offsets_start = _HEADER.size
+        self._records_start = self._offsets_start + (self.count + 1) * _OFFSET.size
+        self._keys = _Keys(self)
+
+    def _record_span(self, i: int) -> tuple[int, int]:
+        start, end = struct.unpack_from(
+            "<II", self._mm, self._offsets_start + i * _OFFSET.size
+        )
+        return self._records_start + start, self._records_start + end
+
+    def _entry(self, i: int) -> list[Token]:
+        start, end = self._record_span(i)
+        surface, furigana, marks = self._mm[start:end].decode().split("\t")
+        return split_okurigana(surface, furigana, [int(m) for m in marks])
+
+    def lookup(self, surface: str) -> list[Token] | None:
+        key = surface.encode()
+        i = bisect.bisect_left(self._keys, key)
+        if i < self.count and self._keys[i] == key:
+            return self._entry(i)
+        return None
+
+    def longest_match(self, text: str, start: int) -> tuple[int, list[Token]] | None:
+        """Longest entry that ``text[start:]`` begins with, and its length"""
+        lo, hi = 0, self.count
+        best: tuple[int, int] | None = None
+        for length in range(1, min(self.max_len, len(text) - start) + 1):
+            prefix = text[start : start + length].encode()
+            # Every key with this prefix sorts between prefix and prefix + 0xff
+            lo = bisect.bisect_left(self._keys, prefix, lo, hi)
+            hi = bisect.bisect_left(self._keys, prefix + b"\xff", lo, hi)
+            if lo == hi:
+                break
+            if self._keys[lo] == prefix:
+                best = (length, lo)
+        if best is None:
+            return None
+        return best[0], self._entry(best[1])
+
+    def segment(self, text: str) -> list[Token | str]:
+        """Split ``text`` into indexed tokens and unresolved strings
+
+        A match may not start or stop inside a run of kanji, so compounds
+        missing from the index are left to the API instead of being split up.
+        """
+        pieces: list[Token | str] = []
+        pending: list[str] = []
+        i = 0
+        while i < len(text):
+            inside_kanji = pending and is_kanji(pending[-1]) and is_kanji(text[i])
+            match = None if inside_kanji else self.longest_match(text, i)
+            if match is not None:
+                length, tokens = match
+                end = i + length
+                if not (
+                    end < len(text) and is_kanji(text[end]) and is_kanji(text[end - 1])
+                ):
+                    if pending:
+                        pieces.append("".join(pending))
+                        pending = []
+                    pieces.extend(tokens)
+                    i = end
+                    continue
+            pending.append(text[i])
+            i += 1
+        if pending:
+            pieces.append("".join(pending))
+        return pieces
+
+    def resolve(self, sentence: str) -> list[Token] | None:
+        """Tokens of ``sentence`` if the index covers all of it, else None
+
+        Punctuation between indexed words needs no lookup. Any other gap
+        leaves the whole sentence to the API, as a particle's pitch depends
+        on the words around it.
+        """
+        tokens: list[Token] = []
+        for piece in self.segment(sentence):
+            if isinstance(piece, tuple):
+                tokens.append(piece)
+            elif all(unicodedata.category(c).startswith("P") for c in piece):
+                tokens.extend((c, c, [0]) for c in piece)
+            else:
+                return None
+        return tokens
+
+    def close(self) -> None:
+        self._mm.close()
+
+
+if __name__ == "__main__":
+    # python -m utils.accent_index accents.txt accent_index.bin
+    if len(sys.argv) != 3:
+        sys.exit("usage: python -m utils.accent_index <dump.tsv> <index.bin>")
+    print(f"📚 Indexed {build_index(sys.argv[1], sys.argv[2])} words")
@@ -0,0 +1,102 @@
+import time
+from collections import OrderedDict
+from collections.abc import Callable, Hashable
+from typing import Generic, TypeVar
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+
+def _hit_rate(hits: int, misses: int) -> float:
+    return hits / (hits + misses) if hits + misses else 0.0
+
+
+class TTLCache(Generic[K, V]):
+    """In-memory LRU cache whose entries also expire after ``ttl`` seconds
+
+    Only meant to be used from the event loop thread.
+    """
+
+    def __init__(self, maxsize: int, ttl: float) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: OrderedDict[K, tuple[float, V]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: K) -> V | None:
+        item = self._data.get(key)
+        if item is None:
+            self.misses += 1
+            return None
+        expires, value = item
+        if expires <= time.monotonic():
+            self._discard(key)
+            self.misses += 1
+            return None
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: K, value: V, ttl: float | None = None) -> None:
+        expires = time.monotonic() + (self.ttl if ttl is None else ttl)
+        self._data[key] = (expires, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._discard(next(iter(self._data)))
+
+    def _discard(self, key: K) -> None:
+        del self._data[key]
+
+    def clear(self) -> None:
+        self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> dict[str, float]:
+        return {
+            "size": len(self._data),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": _hit_rate(self.hits, self.misses),
+        }
+
+
+class SizedTTLCache(TTLCache[K, V]):
+    """TTLCache bounded by the total size of its values instead of their count
+
+    ``sizeof`` gives the size of a value, in bytes for encoded images.
+    Values larger than the whole cache are not stored.
+    """
+
+    def __init__(self, maxsize: int, ttl: float, sizeof: Callable[[V], int]) -> None:
+        super().__init__(maxsize, ttl)
+        self.sizeof = sizeof
+        self.total = 0
+        self._sizes: dict[K, int] = {}
+
+    def set(self, key: K, value: V, ttl: float | None = None) -> None:
+        if key in self._data:
+            self._discard(key)
+        size = self.sizeof(value)
+        if size > self.maxsize:
+            return
+        expires = time.monotonic() + (self.ttl if ttl is None else ttl)
+        self._data[key] = (expires, value)
+        self._sizes[key] = size
+        self.total += size
+        while self.total > self.maxsize:
+            self._discard(next(iter(self._data)))
+
+    def _discard(self, key: K) -> None:
+        del self._data[key]
+        self.total -= self._sizes.pop(key)
+
+    def clear(self) -> None:
+        super().clear()
+        self._sizes.clear()
+        self.total = 0
+
+    def stats(self) -> dict[str, float]:
+        return {**super().stats(), "bytes": self.total}
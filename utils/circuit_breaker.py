@@ -0,0 +1,61 @@
+import time
+from typing import Literal
+
+State = Literal["closed", "open", "half_open"]
+
+
+class CircuitBreaker:
+    """Stop calling a failing backend for a while
+
+    Opens after ``threshold`` failures in a row and rejects calls for
+    ``reset_timeout`` seconds. Then it is half-open: one probe call goes
+    through, and its success closes the breaker while a failure opens it
+    again. A probe that never reports back is replaced after another
+    ``reset_timeout``.
+    """
+
+    def __init__(self, threshold: int, reset_timeout: float) -> None:
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.state: State = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probe_at: float | None = None
+        self.rejected = 0
+        self.trips = 0
+
+    def allow(self) -> bool:
+        now = time.monotonic()
+        if self.state == "closed":
+            return True
+        if self.state == "open":
+            if now - self.opened_at < self.reset_timeout:
+                self.rejected += 1
+                return False
+            self.state = "half_open"
+        if self.probe_at is not None and now - self.probe_at < self.reset_timeout:
+            self.rejected += 1
+            return False
+        self.probe_at = now
+        return True
+
+    def retry_after(self) -> float:
+        """Seconds until a call may be let through again"""
+        if self.state == "closed":
+            return 0.0
+        start = self.opened_at if self.state == "open" else self.probe_at or 0.0
+        return max(0.0, start + self.reset_timeout - time.monotonic())
+
+    def record_success(self) -> None:
+        self.state = "closed"
+        self.failures = 0
+        self.probe_at = None
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self.state == "half_open" or self.failures >= self.threshold:
+            if self.state != "open":
+                self.trips += 1
+            self.state = "open"
+            self.opened_at = time.monotonic()
+            self.probe_at = None
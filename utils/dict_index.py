@@ -0,0 +1,175 @@
+"""Offline dictionary index for /dict, built from a JMdict XML dump.
+
+Entries are stored in a SQLite file in the shape DictQuery returns
+(``kanji``, ``furigana`` and ``definitions`` with ``pos`` and ``meanings``),
+but ``pos`` holds JMdict's English descriptions such as "noun (common)
+(futsuumeishi)" rather than the API's labels.
+Words are found by exact kanji or reading, and English queries fall back to
+an FTS5 index of the glosses. The file is read through SQLite's small page
+cache and memory map, so the dictionary never has to fit on the Python heap.
+
+Build one from JMdict_e.xml (https://www.edrdg.org/jmdict/edict_doc.html):
+    python -m utils.dict_index JMdict_e.xml dict_index.sqlite3
+"""
+
+import json
+import os
+import sqlite3
+import sys
+import threading
+import unicodedata
+import xml.etree.ElementTree as ET
+from collections.abc import Iterator
+from typing import Any
+
+SCHEMA_VERSION = "1"
+# Priority tags JMdict gives to common words, listed first
+COMMON_PRIORITIES = {"news1", "ichi1", "spec1", "spec2", "gai1"}
+# Entries returned for an English query
+MAX_GLOSS_MATCHES = 20
+# Rows written per executemany while building
+BUILD_BATCH = 5000
+XML_LANG = "{http://www.w3.org/XML/1998/namespace}lang"
+
+
+def _normalize(text: str) -> str:
+    return unicodedata.normalize("NFC", text.strip())
+
+
+def _parse_entry(entry: ET.Element) -> tuple[dict[str, Any], bool]:
+    """One <entry> as a DictQuery result item, and whether it is common"""
+    kanji = [_normalize(k.text or "") for k in entry.iterfind("k_ele/keb")]
+    readings = [_normalize(r.text or "") for r in entry.iterfind("r_ele/reb")]
+    common = any(
+        (p.text or "") in COMMON_PRIORITIES
+        for tag in ("k_ele/ke_pri", "r_ele/re_pri")
+        for p in entry.iterfind(tag)
+    )
+    definitions = []
+    pos: list[str] = []
+    for sense in entry.iterfind("sense"):
+        # A sense without <pos> keeps the part of speech of the one before
+        pos = [p.text or "" for p in sense.iterfind("pos")] or pos
+        meanings = [
+            g.text or ""
+            for g in sense.iterfind("gloss")
+            if g.get(XML_LANG, "eng") == "eng"
+        ]
+        if meanings:
+            definitions.append({"pos": pos, "meanings": meanings})
+    item = {"kanji": kanji, "furigana": readings, "definitions": definitions}
+    return item, common
+
+
+def _read_dump(source: str) -> Iterator[tuple[dict[str, Any], bool]]:
+    # iterparse keeps one entry in memory at a time
+    for _, elem in ET.iterparse(source, events=("end",)):
+        if elem.tag == "entry":
+            yield _parse_entry(elem)
+            elem.clear()
+
+
+def build_index(source: str, dest: str) -> int:
+    """Write an index file from a JMdict XML dump, returns the entry count"""
+    tmp = f"{dest}.tmp"
+    if os.path.exists(tmp):
+        os.remove(tmp)
+    conn = sqlite3.connect(tmp)
+    conn.executescript(
+        """
+        CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+        CREATE TABLE entries (
+            id INTEGER PRIMARY KEY, common INTEGER NOT NULL, data TEXT NOT NULL
+        );
+        CREATE TABLE forms (
+            form TEXT NOT NULL, entry INTEGER NOT NULL, PRIMARY KEY (form, entry)
+        ) WITHOUT ROWID;
+        CREATE VIRTUAL TABLE glosses USING fts5(text, content='');
+        """
+    )
+    count = 0
+    entries: list[tuple[int, int, str]] = []
+    forms: set[tuple[str, int]] = set()
+    glosses: list[tuple[int, str]] = []
+
+    def flush() -> None:
+        conn.executemany("INSERT INTO entries VALUES (?, ?, ?)", entries)
+        conn.executemany("INSERT OR IGNORE INTO forms VALUES (?, ?)", forms)
+        conn.executemany("INSERT INTO glosses (rowid, text) VALUES (?, ?)", glosses)
+        entries.clear()
+        forms.clear()
+        glosses.clear()
+
+    for item, common in _read_dump(source):
+        if not item["definitions"]:
+            continue
+        count += 1
+        entries.append((count, common, json.dumps(item, ensure_ascii=False)))
+        forms.update((form, count) for form in item["kanji"] + item["furigana"])
+        text = " ; ".join(m for d in item["definitions"] for m in d["meanings"])
+        glosses.append((count, text))
+        if len(entries) >= BUILD_BATCH:
+            flush()
+    flush()
+    conn.execute("INSERT INTO meta VALUES ('version', ?)", (SCHEMA_VERSION,))
+    conn.commit()
+    conn.execute("VACUUM")
+    conn.close()
+    os.replace(tmp, dest)
+    return count
+
+
+class DictIndex:
+    """Read-only lookups in an index file, safe to call from worker threads
+
+    Lookups block on disk reads, call them with ``asyncio.to_thread``.
+    """
+
+    def __init__(self, path: str, cache_kib: int = 2048) -> None:
+        self._conn = sqlite3.connect(
+            f"file:{path}?mode=ro", uri=True, check_same_thread=False
+        )
+        self._lock = threading.Lock()
+        row = self._conn.execute(
+            "SELECT value FROM meta WHERE key = 'version'"
+        ).fetchone()
+        if row is None or row[0] != SCHEMA_VERSION:
+            self._conn.close()
+            raise ValueError(f"Not a dictionary index or an old version: {path}")
+        # Pages are cached by SQLite and the OS, not as Python objects
+        self._conn.execute(f"PRAGMA cache_size = -{cache_kib}")
+        self._conn.execute("PRAGMA mmap_size = 268435456")
+        (self.count,) = self._conn.execute("SELECT COUNT(*) FROM entries").fetchone()
+
+    def lookup(self, word: str) -> list[Any]:
+        """Entries whose kanji or reading is ``word``, common words first
+
+        Words without a match are searched in the English glosses instead.
+        """
+        word = _normalize(word)
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT e.data FROM forms f JOIN entries e ON e.id = f.entry "
+                "WHERE f.form = ? ORDER BY e.common DESC, e.id",
+                (word,),
+            ).fetchall()
+            if not rows and word.isascii() and word:
+                # Quoted as one phrase, so FTS5 syntax in the query is literal
+                phrase = '"' + word.replace('"', '""') + '"'
+                rows = self._conn.execute(
+                    "SELECT e.data FROM glosses g JOIN entries e ON e.id = g.rowid "
+                    "WHERE glosses MATCH ? ORDER BY g.rank LIMIT ?",
+                    (phrase, MAX_GLOSS_MATCHES),
+                ).fetchall()
+        return [json.loads(data) for (data,) in rows]
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+if __name__ == "__main__":
+    # python -m utils.dict_index JMdict_e.xml dict_index.sqlite3
+    if len(sys.argv) != 3:
+        sys.exit("usage: python -m utils.dict_index <JMdict.xml> <index.sqlite3>")
+    print(f"📚 Indexed {build_index(sys.argv[1], sys.argv[2])} entries")
@@ -0,0 +1,44 @@
+import threading
+
+from PIL import ImageFont
+
+
+class FontRegistry:
+    """Process-wide cache of FreeType faces keyed by (path, size).
+
+    Each face is parsed once and then shared by every render thread. Pillow
+    keeps the GIL while rasterizing, so drawing with a shared face from
+    several ``asyncio.to_thread`` workers is safe.
+    """
+
+    def __init__(self) -> None:
+        self._fonts: dict[tuple[str, int], ImageFont.FreeTypeFont] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, path: str, size: int) -> ImageFont.FreeTypeFont:
+        """Return the cached face for (path, size), loading it on first use"""
+        key = (path, size)
+        with self._lock:
+            font = self._fonts.get(key)
+            if font is not None:
+                self.hits += 1
+                return font
+            self.misses += 1
+            # Loading under the lock keeps concurrent misses from parsing twice
+            font = ImageFont.truetype(path, size)
+            self._fonts[key] = font
+            return font
+
+    def clear(self) -> None:
+        """Drop every loaded face so the memory can be released"""
+        with self._lock:
+            self._fonts.clear()
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            return {"fonts": len(self._fonts), "hits": self.hits, "misses": self.misses}
+
+
+FONT_REGISTRY = FontRegistry()
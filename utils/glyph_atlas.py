@@ -0,0 +1,225 @@
+import math
+import struct
+import threading
+from collections import OrderedDict
+from typing import NamedTuple
+
+from PIL import Image, ImageDraw, ImageFont
+
+# Characters that are rendered over and over and never evicted
+KANA = (
+    "".join(chr(c) for c in range(0x3041, 0x3097))  # ひらがな
+    + "".join(chr(c) for c in range(0x30A1, 0x30FB))  # カタカナ
+    + "ー・、。「」『』（）！？"
+)
+
+
+class Glyph(NamedTuple):
+    mask: Image.Image  # single-character mask rendered with anchor "ls"
+    offset: tuple[int, int]  # where Pillow places ``mask`` relative to the origin
+    advance: int  # pen advance in 26.6 fixed point
+    y_min: int  # bottom of the glyph box in pixels (never above the baseline)
+    ink: tuple[int, int, int, int] | None  # bounding box of non-zero mask pixels
+
+
+def is_kana(char: str) -> bool:
+    return (
+        char < "\u0080" or "\u3000" <= char <= "\u30ff" or "\uff00" <= char <= "\uffef"
+    )
+
+
+def _pixel(value: int) -> int:
+    """Round a 26.6 fixed point value to pixels, like FreeType's PIXEL macro"""
+    return (value + 32) >> 6
+
+
+def _c_round(value: float) -> int:
+    """Round half away from zero like C's round(), unlike Python's round()"""
+    return int(math.copysign(math.floor(abs(value) + 0.5), value))
+
+
+def _f32(value: float) -> float:
+    """Round to single precision, matching the C floats Pillow renders with"""
+    result: float = struct.unpack("f", struct.pack("f", value))[0]
+    return result
+
+
+class GlyphAtlas:
+    """Cache of rasterized glyph masks, blitted with ``Image.paste``.
+
+    ``draw_text`` gives the same pixels as ``ImageDraw.text``: the glyph
+    bitmaps do not depend on the sub-pixel start, so each character is
+    rendered once and placed with the same fixed-point arithmetic Pillow's
+    basic layout uses. Anything the shortcut cannot reproduce exactly
+    (raqm layout, kerning, overlapping glyphs, multiline text) falls back
+    to ``ImageDraw.text``.
+    """
+
+    def __init__(self, kanji_capacity: int = 2048) -> None:
+        self.kanji_capacity = kanji_capacity
+        self._kana: dict[tuple[str, float, str], Glyph] = {}
+        self._kanji: OrderedDict[tuple[str, float, str], Glyph] = OrderedDict()
+        self._y_anchors: dict[tuple[str, float, str], int] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.fallbacks = 0
+
+    def _render_glyph(self, font: ImageFont.FreeTypeFont, char: str) -> Glyph:
+        core, offset = font.getmask2(char, "L", anchor="ls")
+        mask = Image.new("L", core.size)
+        if core.size[0] and core.size[1]:
+            # White on black in mode "L" reproduces the coverage values exactly
+            ImageDraw.Draw(mask).text(
+                (-offset[0], -offset[1]), char, fill=255, font=font, anchor="ls"
+            )
+        return Glyph(
+            mask=mask,
+            offset=offset,
+            advance=round(font.getlength(char) * 64),
+            y_min=-offset[1] - core.size[1],
+            ink=mask.getbbox(),
+        )
+
+    def get(self, font: ImageFont.FreeTypeFont, char: str) -> Glyph:
+        key = (str(font.path), font.size, char)
+        with self._lock:
+            if (glyph := self._kana.get(key)) is not None:
+                self.hits += 1
+                return glyph
+            if (glyph := self._kanji.get(key)) is not None:
+                self._kanji.move_to_end(key)
+                self.hits += 1
+                return glyph
+            self.misses += 1
+            glyph = self._render_glyph(font, char)
+            if is_kana(char):
+                self._kana[key] = glyph
+            else:
+                self._kanji[key] = glyph
+                if len(self._kanji) > self.kanji_capacity:
+                    self._kanji.popitem(last=False)
+            return glyph
+
+    def preload(self, font: ImageFont.FreeTypeFont, chars: str = KANA) -> None:
+        for char in chars:
+            self.get(font, char)
+
+    def _font_y_anchor(
+        self, font: ImageFont.FreeTypeFont, anchor: str, char: str
+    ) -> int:
+        """Vertical anchors that only depend on the font metrics"""
+        key = (str(font.path), font.size, anchor)
+        with self._lock:
+            if (value := self._y_anchors.get(key)) is None:
+                _, (_, y_anchored) = font.getmask2(char, "L", anchor="l" + anchor)
+                _, (_, y_baseline) = font.getmask2(char, "L", anchor="ls")
+                value = self._y_anchors[key] = y_anchored - y_baseline
+            return value
+
+    def draw_text(
+        self,
+        img: Image.Image,
+        xy: tuple[float, float],
+        text: str,
+        font: ImageFont.FreeTypeFont,
+        fill: tuple[int, int, int, int],
+        anchor: str = "la",
+    ) -> None:
+        """Draw ``text`` onto ``img`` like ``ImageDraw.Draw(img).text`` would"""
+        if not self._paste_text(img, xy, text, font, fill, anchor):
+            with self._lock:
+                self.fallbacks += 1
+            ImageDraw.Draw(img).text(xy, text, fill=fill, font=font, anchor=anchor)
+
+    def _paste_text(
+        self,
+        img: Image.Image,
+        xy: tuple[float, float],
+        text: str,
+        font: ImageFont.FreeTypeFont,
+        fill: tuple[int, int, int, int],
+        anchor: str,
+    ) -> bool:
+        if (
+            not text
+            or "\n" in text
+            or xy[0] < 0
+            or xy[1] < 0
+            or font.layout_engine != ImageFont.Layout.BASIC
+            or len(anchor) != 2
+            or anchor[0] not in "lmr"
+            or anchor[1] not in "atmsbd"
+        ):
+            return False
+
+        glyphs = [self.get(font, char) for char in text]
+
+        # Pen position of every glyph, in 26.6
+        positions = []
+        position = 0
+        for glyph in glyphs:
+            positions.append(position)
+            position += glyph.advance
+        # Kerning changes the advances, leave those strings to Pillow
+        if position != round(font.getlength(text) * 64):
+            return False
+
+        x_min = min(0, *(g.offset[0] + _pixel(p) for g, p in zip(glyphs, positions)))
+        y_max = max(0, *(-g.offset[1] for g in glyphs))
+        x_anchor = {"l": 0, "m": _pixel(position // 2), "r": _pixel(position)}[
+            anchor[0]
+        ]
+        if anchor[1] == "t":
+            y_anchor = y_max
+        elif anchor[1] == "b":
+            y_anchor = min(0, *(g.y_min for g in glyphs))
+        elif anchor[1] == "s":
+            y_anchor = 0
+        else:
+            y_anchor = self._font_y_anchor(font, anchor[1], text[0])
+
+        # Integer origin and sub-pixel start, as in ImageDraw.text
+        x0, y0 = int(xy[0]), int(xy[1])
+        x_start = _f32(math.modf(xy[0])[0])
+        y_start = _f32(math.modf(xy[1])[0])
+        pen_x = _c_round(_f32(-x_min + x_start) * 64)
+        pen_y = _c_round(_f32(-y_max - y_start) * 64)
+        base_x = x0 - x_anchor + x_min
+        base_y = y0 + y_anchor - y_max - _pixel(pen_y)
+
+        placed = []
+        right_edge: int | None = None
+        for glyph, p in zip(glyphs, positions):
+            if glyph.ink is None:
+                continue
+            x = base_x + _pixel(pen_x + p) + glyph.offset[0]
+            y = base_y + glyph.offset[1]
+            # Pillow merges overlapping glyphs with max(), pasting would blend them
+            if right_edge is not None and x + glyph.ink[0] < right_edge:
+                return False
+            right_edge = x + glyph.ink[2]
+            placed.append((glyph.mask, (x, y)))
+
+        for mask, box in placed:
+            img.paste(fill, box, mask)
+        return True
+
+    def clear(self) -> None:
+        with self._lock:
+            self._kana.clear()
+            self._kanji.clear()
+            self._y_anchors.clear()
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            return {
+                "kana": len(self._kana),
+                "kanji": len(self._kanji),
+                "hits": self.hits,
+                "misses": self.misses,
+                "fallbacks": self.fallbacks,
+            }
+
+
+GLYPH_ATLAS = GlyphAtlas()
@@ -0,0 +1,96 @@
+import io
+import sys
+import time
+from typing import Literal, NamedTuple
+
+from PIL import Image
+
+# "svg" is built from the layout instead of being encoded from pixels
+ImageEncoding = Literal["png", "palette", "webp", "svg"]
+
+FILE_EXTENSIONS: dict[ImageEncoding, str] = {
+    "png": "png",
+    "palette": "png",
+    "webp": "webp",
+    "svg": "svg",
+}
+
+
+class EncodingResult(NamedTuple):
+    encoding: ImageEncoding
+    compress_level: int
+    size: int  # bytes
+    seconds: float
+
+
+def encode_image(
+    img: Image.Image, encoding: ImageEncoding = "png", compress_level: int = 6
+) -> io.BytesIO:
+    """Encode an RGBA image for upload
+
+    png: full RGBA PNG at the given zlib level
+    palette: quantized to a 256 color palette with alpha, then PNG
+    webp: lossless WebP, ``compress_level`` does not apply
+    """
+    buffer = io.BytesIO()
+    if encoding == "png":
+        img.save(buffer, format="PNG", compress_level=compress_level)
+    elif encoding == "palette":
+        # Fast octree is the quantizer that keeps the alpha channel
+        palette_img = img.quantize(256, method=Image.Quantize.FASTOCTREE)
+        palette_img.save(buffer, format="PNG", compress_level=compress_level)
+    elif encoding == "webp":
+        img.save(buffer, format="WEBP", lossless=True)
+    elif encoding == "svg":
+        raise ValueError("SVG is built from the layout, see utils.mark_svg")
+    else:
+        raise ValueError(f"Unknown image encoding: {encoding}")
+    buffer.seek(0)
+    return buffer
+
+
+def compare_encodings(
+    img: Image.Image, compress_levels: tuple[int, ...] = (1, 6, 9)
+) -> list[EncodingResult]:
+    """Encode ``img`` in every mode and measure output bytes and encode time"""
+    results = []
+    runs: list[tuple[ImageEncoding, int]] = [
+        *(
+            (encoding, level)
+            for encoding in ("png", "palette")
+            for level in compress_levels
+        ),
+        ("webp", 0),
+    ]
+    for encoding, level in runs:
+        start = time.perf_counter()
+        size = encode_image(img, encoding, level).getbuffer().nbytes
+        results.append(
+            EncodingResult(encoding, level, size, time.perf_counter() - start)
+        )
+    return results
+
+
+def format_report(results: list[EncodingResult]) -> str:
+    # Ratios are relative to the default PNG output (zlib level 6)
+    baseline = next(
+        (r.size for r in results if r.encoding == "png" and r.compress_level == 6),
+        results[0].size if results else 0,
+    )
+    lines = [f"{'encoding':<10}{'level':>6}{'bytes':>10}{'ratio':>8}{'ms':>9}"]
+    for r in results:
+        level = str(r.compress_level) if r.encoding != "webp" else "-"
+        ratio = r.size / baseline if baseline else 0
+        lines.append(
+            f"{r.encoding:<10}{level:>6}{r.size:>10}{ratio:>8.2f}"
+            f"{r.seconds * 1000:>9.1f}"
+        )
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    # python -m utils.image_encoding marked_text.png
+    for path in sys.argv[1:]:
+        with Image.open(path) as source:
+            print(f"{path} {source.size[0]}x{source.size[1]}")
+            print(format_report(compare_encodings(source.convert("RGBA"))))
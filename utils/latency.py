@@ -0,0 +1,24 @@
+from collections import deque
+
+# Latencies needed before a percentile is trusted
+MIN_SAMPLES = 20
+
+
+class LatencyWindow:
+    """The most recent ``size`` latencies, in seconds"""
+
+    def __init__(self, size: int = 200) -> None:
+        self._samples: deque[float] = deque(maxlen=size)
+
+    def add(self, seconds: float) -> None:
+        self._samples.append(seconds)
+
+    def percentile(self, q: float) -> float | None:
+        """Latency below which ``q`` of the samples fall, None if too few"""
+        if len(self._samples) < MIN_SAMPLES:
+            return None
+        ordered = sorted(self._samples)
+        return ordered[min(int(q * len(ordered)), len(ordered) - 1)]
+
+    def __len__(self) -> int:
+        return len(self._samples)
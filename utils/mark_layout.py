@@ -0,0 +1,250 @@
+"""Layout stage of the /mark renderer.
+
+Turns the ``(surface, furigana, accent)`` tokens returned by MarkAccent into
+text positions and accent polylines. Nothing here depends on Pillow: font
+measurements come from a ``TextMetrics`` object supplied by the raster stage.
+"""
+
+from array import array
+from typing import NamedTuple, Protocol
+
+Token = tuple[str, str, list[int]]
+
+MAX_WORD_PER_LINE = 40
+SPACING = 40
+BORDER_SIZE = 20
+FURI_RATIO = 0.5
+
+
+class TextMetrics(Protocol):
+    @property
+    def line_height(self) -> float:
+        """Bottom of the "A" bounding box, the base of multiline spacing"""
+        ...
+
+    def bbox(self, text: str) -> tuple[float, float, float, float]:
+        """Bounding box of a single line drawn at (0, 0) with anchor "la" """
+        ...
+
+
+class MarkLayout(NamedTuple):
+    width: int
+    height: int
+    line_count: int
+    # Base font text drawn with anchor "lm", flattened as x0, y0, x1, y1, ...
+    surfaces: list[str]
+    surface_xy: "array[float]"
+    # Furigana drawn with anchor "mb"
+    furigana: list[str]
+    furigana_xy: "array[float]"
+    # Accent lines, each run as one flattened polyline
+    accents: "list[array[float]]"
+    # Debug boxes as x0, y0, x1, y1 per token, empty unless draw_box is set
+    furigana_boxes: "array[float]"
+    kanji_boxes: "array[float]"
+
+
+def is_kanji(char: str) -> bool:
+    return "\u4e00" <= char <= "\u9fff"
+
+
+def has_furigana(surface: str, furigana: str) -> bool:
+    """Furigana is only shown above words that contain kanji"""
+    return bool(furigana) and furigana != surface and any(map(is_kanji, surface))
+
+
+class _PolylineBuilder:
+    """Joins consecutive accent segments into polylines"""
+
+    def __init__(self) -> None:
+        self.lines: list[array[float]] = []
+        self._last: tuple[float, float] | None = None
+
+    def add(self, x0: float, y0: float, x1: float, y1: float) -> None:
+        if self._last == (x0, y0):
+            self.lines[-1].extend((x1, y1))
+        else:
+            self.lines.append(array("d", (x0, y0, x1, y1)))
+        self._last = (x1, y1)
+
+
+def _add_accent(
+    lines: _PolylineBuilder,
+    x: int,
+    y: int,
+    width: int,
+    furi_height: int,
+    accents: list[int],
+    n_kanji: int,
+    n_furi: int,
+    with_furigana: bool,
+) -> None:
+    """
+    x, y: 左上角位置
+    width: 該文字區域寬度
+    furi_height: 振假名高度 (用來估算線的垂直位置)
+    accents: 每個音節的 accent_type 0,1,2
+    """
+    line_y = y - 30  # furi高度
+
+    # 沒furi 畫線寬度漢字寬
+    if not with_furigana:
+        for idx, accent_type in enumerate(accents):
+            if accent_type in (1, 2):
+                lines.add(x + idx * width, line_y, x + (idx + 1) * width, line_y)
+            if accent_type == 2:
+                drop_x = x + (idx + 1) * width
+                lines.add(drop_x, line_y, drop_x, line_y + furi_height)
+        return
+
+    # 有furi 畫線寬度furi寬
+    n_start = (n_kanji / 2 - n_furi / 4) * width
+    for idx, accent_type in enumerate(accents):
+        if accent_type not in (1, 2):
+            continue
+        start_x = x + n_start + idx * width / 2
+        end_x = x + n_start + (idx + 1) * width / 2
+        if idx == 0:
+            lines.add(x, line_y, x + n_start, line_y)
+        lines.add(start_x, line_y, end_x, line_y)
+        if accent_type == 2:
+            lines.add(end_x, line_y, end_x, line_y + furi_height)
+        elif idx == n_furi - 1 and idx != 0:
+            lines.add(end_x, line_y, x + n_kanji * width, line_y)
+
+
+def paginate(
+    query: list[Token],
+    max_lines: int,
+    max_word_per_line: int = MAX_WORD_PER_LINE,
+) -> list[list[Token]]:
+    """Split tokens into pages of at most ``max_lines`` wrapped lines
+
+    Uses the same wrapping rule as ``layout_tokens``, so every page lays out
+    exactly like the matching lines of the whole text.
+    """
+    pages: list[list[Token]] = [[]]
+    line = 0
+    char_cnt = 0
+    for token in query:
+        if char_cnt + len(token[0]) > max_word_per_line:
+            line += 1
+            char_cnt = 0
+            if line == max_lines:
+                pages.append([])
+                line = 0
+        pages[-1].append(token)
+        char_cnt += len(token[0])
+    return [page for page in pages if page]
+
+
+def layout_tokens(
+    query: list[Token],
+    metrics: TextMetrics,
+    draw_box: bool = False,
+    max_word_per_line: int = MAX_WORD_PER_LINE,
+) -> MarkLayout:
+    # 自動換行: one pass that remembers each token's column and line
+    columns = array("i")
+    rows = array("i")
+    line_texts: list[str] = []
+    line_lengths: list[int] = []
+    current_line: list[str] = []
+    char_cnt = 0
+    for surface, _, _ in query:
+        if char_cnt + len(surface) > max_word_per_line:
+            line_texts.append("".join(current_line))
+            line_lengths.append(char_cnt)
+            current_line = []
+            char_cnt = 0
+        columns.append(char_cnt)
+        rows.append(len(line_texts))
+        current_line.append(surface)
+        char_cnt += len(surface)
+    if current_line:
+        line_texts.append("".join(current_line))
+        line_lengths.append(char_cnt)
+
+    lines_num = len(line_texts)
+    word_per_line = max(line_lengths, default=1)
+
+    # Same box as ImageDraw.multiline_textbbox(spacing=SPACING, align="left")
+    line_spacing = metrics.line_height + SPACING
+    bbox: tuple[float, float, float, float] | None = None
+    for idx, text in enumerate("\n".join(line_texts).split("\n")):
+        left, top, right, bottom = metrics.bbox(text)
+        top += idx * line_spacing
+        bottom += idx * line_spacing
+        if bbox is None:
+            bbox = (left, top, right, bottom)
+        else:
+            bbox = (
+                min(bbox[0], left),
+                min(bbox[1], top),
+                max(bbox[2], right),
+                max(bbox[3], bottom),
+            )
+    assert bbox is not None
+
+    furi_height = int(SPACING * FURI_RATIO)
+    empty_space = SPACING - furi_height
+    width = bbox[2] - bbox[0] + 2 * BORDER_SIZE
+    height = bbox[3] - bbox[1] + SPACING + 2 * BORDER_SIZE - empty_space
+    height += furi_height + 20
+
+    furi_width = (width - 2 * BORDER_SIZE) / word_per_line
+    padding_height = (height - 2 * BORDER_SIZE + empty_space) / max(lines_num, 1)
+    kanji_height = padding_height - empty_space
+
+    surfaces: list[str] = []
+    surface_xy = array("d")
+    furigana_list: list[str] = []
+    furigana_xy = array("d")
+    furigana_boxes = array("d")
+    kanji_boxes = array("d")
+    accent_lines = _PolylineBuilder()
+    for (surface, furigana, accent), column, row in zip(query, columns, rows):
+        x = column * furi_width + BORDER_SIZE
+        y_base = (
+            BORDER_SIZE + SPACING
+            if lines_num == 1
+            else row * padding_height + BORDER_SIZE + empty_space
+        )
+        box_right = x + furi_width * len(surface)
+
+        if draw_box:
+            furigana_boxes.extend((x, y_base - furi_height, box_right, y_base))
+            kanji_boxes.extend((x, y_base, box_right, y_base + kanji_height))
+
+        with_furigana = has_furigana(surface, furigana)
+        if with_furigana:
+            furigana_list.append(furigana)
+            furigana_xy.extend((int(x + furi_width * len(surface) / 2), y_base - 5))
+
+        surfaces.append(surface)
+        surface_xy.extend((x, y_base + kanji_height / 2 - 20))
+
+        _add_accent(
+            accent_lines,
+            int(x),
+            int(y_base),
+            int(furi_width),
+            furi_height,
+            accent,
+            len(surface),
+            len(furigana) if furigana else len(surface),
+            with_furigana,
+        )
+
+    return MarkLayout(
+        width=int(width),
+        height=int(height),
+        line_count=lines_num,
+        surfaces=surfaces,
+        surface_xy=surface_xy,
+        furigana=furigana_list,
+        furigana_xy=furigana_xy,
+        accents=accent_lines.lines,
+        furigana_boxes=furigana_boxes,
+        kanji_boxes=kanji_boxes,
+    )
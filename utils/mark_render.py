@@ -0,0 +1,141 @@
+"""Raster stage of /mark: draws computed layouts and encodes the pages.
+
+Kept out of the cog, since bot.py imports cogs.mark_text through the context
+menus and load_extension executes it again as a separate module. The render
+backend and image cache here are the ones both copies share, so the queue
+bound is global, the workers are started and shut down once, and a page
+rendered for /mark is reused by the context menu.
+"""
+
+import io
+
+from PIL import Image, ImageDraw, ImageFont
+
+from config.settings import (
+    MARK_IMAGE_CACHE_BYTES,
+    MARK_IMAGE_CACHE_TTL,
+    MARK_PNG_COMPRESS_LEVEL,
+    MARK_RENDER_BACKEND,
+    MARK_RENDER_QUEUE_SIZE,
+    MARK_RENDER_WORKERS,
+)
+from utils.cache import SizedTTLCache
+from utils.font_registry import FONT_REGISTRY
+from utils.glyph_atlas import GLYPH_ATLAS
+from utils.image_encoding import ImageEncoding, encode_image
+from utils.mark_layout import MarkLayout, Token, layout_tokens
+from utils.mark_svg import layout_to_svg
+from utils.render_backend import RenderBackend
+
+FONT_PATH = "./font/NotoSerifJP-Regular.otf"
+BASE_FONT_SIZE = 40
+FURI_FONT_SIZE = 20
+WHITE = (255, 255, 255, 255)
+
+
+class PillowMetrics:
+    """TextMetrics for the layout stage, measured with a FreeType face"""
+
+    def __init__(self, font: ImageFont.FreeTypeFont) -> None:
+        self.font = font
+        self.line_height = font.getbbox("A")[3]
+
+    def bbox(self, text: str) -> tuple[float, float, float, float]:
+        return self.font.getbbox(text)
+
+
+def rasterize(layout: MarkLayout, use_atlas: bool = True) -> Image.Image:
+    """Draw a computed layout onto a transparent canvas
+
+    With ``use_atlas`` the text is blitted from cached glyph masks instead of
+    being rasterized by FreeType on every call; the pixels are the same.
+    """
+    font = FONT_REGISTRY.get(FONT_PATH, BASE_FONT_SIZE)
+    furi_font = FONT_REGISTRY.get(FONT_PATH, FURI_FONT_SIZE)
+
+    img = Image.new(mode="RGBA", size=(layout.width, layout.height), color=(0, 0, 0, 0))
+    d = ImageDraw.Draw(img)
+
+    for i in range(0, len(layout.kanji_boxes), 4):
+        d.rectangle(tuple(layout.furigana_boxes[i : i + 4]), outline=(255, 0, 0))
+        d.rectangle(tuple(layout.kanji_boxes[i : i + 4]), outline=(0, 0, 255))
+
+    text_runs = (
+        (layout.furigana, layout.furigana_xy, furi_font, "mb"),
+        (layout.surfaces, layout.surface_xy, font, "lm"),
+    )
+    for texts, coords, text_font, anchor in text_runs:
+        for i, text in enumerate(texts):
+            xy = (coords[2 * i], coords[2 * i + 1])
+            if use_atlas:
+                GLYPH_ATLAS.draw_text(img, xy, text, text_font, WHITE, anchor=anchor)
+            else:
+                d.text(xy, text, fill=WHITE, font=text_font, anchor=anchor)
+
+    # 畫 accent, one polyline per run. Pillow reads buffer objects as float32,
+    # so the double precision arrays are passed as lists.
+    for points in layout.accents:
+        d.line(points.tolist(), fill=(255, 0, 0), width=2)
+
+    return img
+
+
+def generate_image(
+    query: list[Token],
+    draw_box: bool = False,
+    use_atlas: bool = True,
+    encoding: ImageEncoding = "png",
+    compress_level: int = MARK_PNG_COMPRESS_LEVEL,
+) -> io.BytesIO:
+    """Synchronous image generation function, should be executed in the thread pool"""
+    font = FONT_REGISTRY.get(FONT_PATH, BASE_FONT_SIZE)
+    layout = layout_tokens(query, PillowMetrics(font), draw_box=draw_box)
+    if encoding == "svg":
+        # Vector output skips the RGBA canvas entirely
+        svg = layout_to_svg(
+            layout, font.getname()[0] or "serif", BASE_FONT_SIZE, FURI_FONT_SIZE
+        )
+        return io.BytesIO(svg.encode())
+    img = rasterize(layout, use_atlas)
+    return encode_image(img, encoding, compress_level)
+
+
+def generate_bytes(
+    query: list[Token],
+    draw_box: bool = False,
+    encoding: ImageEncoding = "png",
+) -> bytes:
+    """Render straight to encoded bytes, so process workers can return them"""
+    # getvalue() hands over the buffer's bytes object without copying it
+    return generate_image(query, draw_box, encoding=encoding).getvalue()
+
+
+def init_render_worker() -> None:
+    """Load the fonts and kana glyphs before the first render"""
+    try:
+        font = FONT_REGISTRY.get(FONT_PATH, BASE_FONT_SIZE)
+        furi_font = FONT_REGISTRY.get(FONT_PATH, FURI_FONT_SIZE)
+    except OSError as e:
+        print(f"⚠️ Failed to preload font {FONT_PATH}: {e}")
+        return
+    GLYPH_ATLAS.preload(font)
+    GLYPH_ATLAS.preload(furi_font)
+
+
+RENDER_BACKEND = RenderBackend(
+    MARK_RENDER_BACKEND,
+    max_workers=MARK_RENDER_WORKERS,
+    queue_size=MARK_RENDER_QUEUE_SIZE,
+    initializer=init_render_worker,
+)
+
+# Encoded page images and total page count, keyed on the normalized text,
+# draw_box, encoding and page limit
+ImageCacheKey = tuple[str, bool, str, int]
+IMAGE_CACHE: SizedTTLCache[ImageCacheKey, tuple[tuple[bytes, ...], int]] = (
+    SizedTTLCache(
+        MARK_IMAGE_CACHE_BYTES,
+        MARK_IMAGE_CACHE_TTL,
+        sizeof=lambda entry: sum(map(len, entry[0])),
+    )
+)
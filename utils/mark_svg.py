@@ -0,0 +1,69 @@
+"""SVG output for /mark, assembled from the same layout as the PNG renderer.
+
+The document only references the font by family name, so it scales cleanly
+and costs a string join instead of an RGBA canvas.
+"""
+
+from array import array
+from collections.abc import Iterator
+from xml.sax.saxutils import escape, quoteattr
+
+from utils.mark_layout import MarkLayout
+
+
+def _num(value: float) -> str:
+    return f"{value:.2f}".rstrip("0").rstrip(".")
+
+
+def _points(coords: "array[float]") -> str:
+    return " ".join(
+        f"{_num(coords[i])},{_num(coords[i + 1])}" for i in range(0, len(coords), 2)
+    )
+
+
+def _rects(boxes: "array[float]", color: str) -> Iterator[str]:
+    for i in range(0, len(boxes), 4):
+        x0, y0, x1, y1 = boxes[i : i + 4]
+        yield (
+            f'<rect x="{_num(x0)}" y="{_num(y0)}" width="{_num(x1 - x0)}" '
+            f'height="{_num(y1 - y0)}" stroke="{color}"/>'
+        )
+
+
+def layout_to_svg(
+    layout: MarkLayout, font_family: str, font_size: int, furi_font_size: int
+) -> str:
+    """Build an SVG document matching what ``rasterize`` draws"""
+    style = (
+        f"text{{font-family:{quoteattr(font_family)},serif;fill:#fff}}"
+        # Pillow anchor "lm": left, vertical middle
+        f".k{{font-size:{font_size}px;dominant-baseline:central}}"
+        # Pillow anchor "mb": horizontal middle, bottom
+        f".f{{font-size:{furi_font_size}px;text-anchor:middle;"
+        "dominant-baseline:text-after-edge}"
+        "rect{fill:none}"
+        "polyline{fill:none;stroke:red;stroke-width:2}"
+    )
+    parts = [
+        '<svg xmlns="http://www.w3.org/2000/svg" '
+        f'width="{layout.width}" height="{layout.height}" '
+        f'viewBox="0 0 {layout.width} {layout.height}">',
+        f"<style>{style}</style>",
+    ]
+    parts.extend(_rects(layout.furigana_boxes, "red"))
+    parts.extend(_rects(layout.kanji_boxes, "blue"))
+
+    text_runs = (
+        (layout.furigana, layout.furigana_xy, "f"),
+        (layout.surfaces, layout.surface_xy, "k"),
+    )
+    for texts, coords, css_class in text_runs:
+        for i, text in enumerate(texts):
+            parts.append(
+                f'<text class="{css_class}" x="{_num(coords[2 * i])}" '
+                f'y="{_num(coords[2 * i + 1])}">{escape(text)}</text>'
+            )
+
+    parts.extend(f'<polyline points="{_points(line)}"/>' for line in layout.accents)
+    parts.append("</svg>")
+    return "\n".join(parts)
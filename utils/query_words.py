@@ -0,0 +1,72 @@
+import math
+import re
+import unicodedata
+
+from discord import Interaction, app_commands
+
+from config.settings import MAX_WORDS_PER_QUERY
+from utils.rate_limit import WORD_RATE_LIMITER
+from utils.word_index import WORD_INDEX
+
+# The word being typed, after the last space or comma
+LAST_WORD = re.compile(r"[^\s,]*$")
+# Discord's limit on the name and value of an autocomplete choice
+CHOICE_LIMIT = 100
+
+
+def split_words(words: str) -> list[str]:
+    """Split input by spaces or commas, dropping repeated words"""
+    word_list = [
+        unicodedata.normalize("NFC", word.strip())
+        for word in words.replace(",", " ").split()
+        if word.strip()
+    ]
+    return list(dict.fromkeys(word_list))
+
+
+async def prepare_words(
+    interaction: Interaction, words: str
+) -> tuple[list[str], str] | None:
+    """Split, cap and rate limit the words of a query
+
+    Replies to the interaction and returns None when nothing should be
+    queried, otherwise defers it and returns the words to look up with a
+    notice to show above the results ("" if there is none).
+    """
+    word_list = split_words(words)
+    if not word_list:
+        await interaction.response.send_message("❌ 請提供有效的單字！", ephemeral=True)
+        return None
+
+    wait = WORD_RATE_LIMITER.try_acquire(
+        interaction.user.id, min(len(word_list), MAX_WORDS_PER_QUERY)
+    )
+    if wait:
+        await interaction.response.send_message(
+            f"⏳ 查詢太頻繁，請在 {math.ceil(wait)} 秒後再試。", ephemeral=True
+        )
+        return None
+
+    await interaction.response.defer()
+    notice = ""
+    if len(word_list) > MAX_WORDS_PER_QUERY:
+        notice = (
+            f"⚠️ 一次最多查詢 {MAX_WORDS_PER_QUERY} 個單字，"
+            f"只查詢前 {MAX_WORDS_PER_QUERY} 個（共 {len(word_list)} 個）"
+        )
+    return word_list[:MAX_WORDS_PER_QUERY], notice
+
+
+async def autocomplete_words(
+    interaction: Interaction, current: str
+) -> list[app_commands.Choice[str]]:
+    """Complete the last of the words being typed from the local word index"""
+    match = LAST_WORD.search(current)
+    assert match is not None
+    head = current[: match.start()]
+    choices = [head + word for word in WORD_INDEX.complete(match.group())]
+    return [
+        app_commands.Choice(name=choice, value=choice)
+        for choice in choices
+        if len(choice) <= CHOICE_LIMIT
+    ]
@@ -0,0 +1,46 @@
+import time
+from collections.abc import Hashable
+
+from config.settings import USER_WORD_BURST, USER_WORD_RATE
+
+
+class TokenBucket:
+    """Token bucket per key, refilled at ``rate`` tokens per second
+
+    Each key starts with a full bucket of ``capacity`` tokens.
+    """
+
+    def __init__(self, rate: float, capacity: float, max_keys: int = 4096) -> None:
+        self.rate = rate
+        self.capacity = capacity
+        self.max_keys = max_keys
+        self._buckets: dict[Hashable, tuple[float, float]] = {}  # tokens, updated
+        self.rejected = 0
+
+    def _tokens(self, key: Hashable, now: float) -> float:
+        tokens, updated = self._buckets.get(key, (self.capacity, now))
+        return min(self.capacity, tokens + (now - updated) * self.rate)
+
+    def try_acquire(self, key: Hashable, cost: float = 1) -> float:
+        """Take ``cost`` tokens, returns 0 on success or the seconds to wait"""
+        now = time.monotonic()
+        tokens = self._tokens(key, now)
+        # A request larger than the bucket is allowed once the bucket is full
+        cost = min(cost, self.capacity)
+        if tokens < cost:
+            self._buckets[key] = (tokens, now)
+            self.rejected += 1
+            return (cost - tokens) / self.rate
+        self._buckets[key] = (tokens - cost, now)
+        if len(self._buckets) > self.max_keys:
+            self._prune(now)
+        return 0.0
+
+    def _prune(self, now: float) -> None:
+        # Full buckets hold no state worth keeping
+        for key in [k for k in self._buckets if self._tokens(k, now) >= self.capacity]:
+            del self._buckets[key]
+
+
+# Words per user shared by /dict, /usage and their context menus
+WORD_RATE_LIMITER = TokenBucket(USER_WORD_RATE, USER_WORD_BURST)
@@ -0,0 +1,102 @@
+import asyncio
+import concurrent.futures
+import multiprocessing
+from collections.abc import Callable
+from typing import Any, TypeVar
+
+T = TypeVar("T")
+RENDER_MODES = ("thread", "process", "inline")
+
+
+class RenderBusyError(Exception):
+    """Raised when the render queue is full and the job is rejected"""
+
+
+class RenderBackend:
+    """Runs blocking render jobs off the event loop behind a bounded queue.
+
+    ``thread`` uses a thread pool, ``process`` a spawn-based process pool so
+    Pillow's drawing loop does not hold the bot's GIL, and ``inline`` runs
+    the job directly on the event loop. The pool is created on first use, so
+    ``shutdown`` can be called on cog unload without breaking later calls.
+    """
+
+    def __init__(
+        self,
+        mode: str = "thread",
+        max_workers: int = 2,
+        queue_size: int = 8,
+        initializer: Callable[[], None] | None = None,
+    ) -> None:
+        if mode not in RENDER_MODES:
+            raise ValueError(f"Unknown render backend: {mode}")
+        self.mode = mode
+        self.max_workers = max_workers
+        self.queue_size = queue_size
+        self.initializer = initializer
+        self.pending = 0
+        self.rejected = 0
+        self._executor: concurrent.futures.Executor | None = None
+        self._inline_ready = False
+
+    def _get_executor(self) -> concurrent.futures.Executor:
+        if self._executor is None:
+            if self.mode == "process":
+                self._executor = concurrent.futures.ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=self.initializer,
+                )
+            else:
+                self._executor = concurrent.futures.ThreadPoolExecutor(
+                    max_workers=self.max_workers,
+                    thread_name_prefix="render",
+                    initializer=self.initializer,
+                )
+        return self._executor
+
+    async def run(self, fn: Callable[..., T], *args: Any) -> T:
+        """Run ``fn(*args)`` on the backend, or raise RenderBusyError if full"""
+        return (await self.run_many(fn, [args]))[0]
+
+    async def run_many(
+        self, fn: Callable[..., T], jobs: list[tuple[Any, ...]]
+    ) -> list[T]:
+        """Run ``fn`` once per argument tuple, concurrently, as one submission
+
+        The queue counts submissions, so the pages of one message are either
+        all accepted or rejected together.
+        """
+        if self.pending >= self.queue_size:
+            self.rejected += 1
+            raise RenderBusyError(f"Render queue is full ({self.pending} pending)")
+
+        self.pending += 1
+        try:
+            if self.mode == "inline":
+                if not self._inline_ready and self.initializer is not None:
+                    self.initializer()
+                self._inline_ready = True
+                return [fn(*args) for args in jobs]
+
+            loop = asyncio.get_running_loop()
+            executor = self._get_executor()
+            try:
+                return await asyncio.gather(
+                    *(loop.run_in_executor(executor, fn, *args) for args in jobs)
+                )
+            except concurrent.futures.BrokenExecutor:
+                # A crashed worker breaks the whole pool, start a new one next time
+                self._executor = None
+                raise
+        finally:
+            self.pending -= 1
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+        self._inline_ready = False
+
+    def stats(self) -> dict[str, int]:
+        return {"pending": self.pending, "rejected": self.rejected}
@@ -0,0 +1,125 @@
+import asyncio
+import time
+from collections.abc import Awaitable, Callable
+
+import discord
+from discord import Interaction
+
+# Discord's limit on message content
+MESSAGE_LIMIT = 2000
+# Seconds between edits while results stream in, within Discord's 5 per 5 s
+EDIT_INTERVAL = 1.0
+
+
+def split_message(text: str, limit: int = MESSAGE_LIMIT) -> list[str]:
+    """Split text into messages at line breaks, cutting only overlong lines"""
+    messages: list[str] = []
+    current = ""
+    for line in text.split("\n"):
+        while len(line) > limit:
+            if current:
+                messages.append(current)
+                current = ""
+            messages.append(line[:limit])
+            line = line[limit:]
+        if not current:
+            current = line
+        elif len(current) + 1 + len(line) <= limit:
+            current += "\n" + line
+        else:
+            messages.append(current)
+            current = line
+    if current.strip():
+        messages.append(current)
+    return messages
+
+
+class _StreamedReply:
+    """The deferred response plus any followups the text spills into"""
+
+    def __init__(self, interaction: Interaction) -> None:
+        self.interaction = interaction
+        self.sent: list[str] = []
+        self.followups: list[discord.WebhookMessage] = []
+
+    async def update(self, text: str) -> None:
+        pages = split_message(text) or ["❌ 找不到結果"]
+        for idx, page in enumerate(pages):
+            if idx < len(self.sent):
+                if page == self.sent[idx]:
+                    continue
+                if idx == 0:
+                    await self.interaction.edit_original_response(content=page)
+                else:
+                    await self.followups[idx - 1].edit(content=page)
+                self.sent[idx] = page
+            elif idx == 0:
+                await self.interaction.edit_original_response(content=page)
+                self.sent.append(page)
+            else:
+                message = await self.interaction.followup.send(page, wait=True)
+                self.followups.append(message)
+                self.sent.append(page)
+        # Drop followups the text no longer needs
+        while len(self.sent) > len(pages):
+            await self.followups.pop().delete()
+            self.sent.pop()
+
+
+async def stream_results(
+    interaction: Interaction,
+    items: list[str],
+    query: Callable[[str], Awaitable[str]],
+    pending: Callable[[str], str],
+    header: str = "",
+) -> None:
+    """Show query results in the deferred response as they complete
+
+    Results keep the order of ``items``; ``pending`` formats the placeholder
+    of an item that has not finished yet. The reply is edited at most every
+    EDIT_INTERVAL seconds, and text beyond one message spills into
+    followups instead of being truncated.
+    """
+    results = [pending(item) for item in items]
+
+    async def indexed(idx: int, item: str) -> tuple[int, str]:
+        return idx, await query(item)
+
+    def render() -> str:
+        return "\n".join([header, *results] if header else results)
+
+    reply = _StreamedReply(interaction)
+    lock = asyncio.Lock()
+    last_edit = 0.0
+    scheduled: asyncio.Task[None] | None = None
+
+    async def flush() -> None:
+        nonlocal last_edit
+        async with lock:
+            await reply.update(render())
+            last_edit = time.monotonic()
+
+    async def flush_later(delay: float) -> None:
+        await asyncio.sleep(delay)
+        await flush()
+
+    for next_result in asyncio.as_completed(
+        [indexed(idx, item) for idx, item in enumerate(items)]
+    ):
+        idx, text = await next_result
+        results[idx] = text
+        # The first result is shown right away, later ones at most once per
+        # EDIT_INTERVAL, so results never wait for the slowest word
+        delay = last_edit + EDIT_INTERVAL - time.monotonic()
+        if delay <= 0 and not lock.locked():
+            await flush()
+        elif scheduled is None or scheduled.done():
+            scheduled = asyncio.create_task(flush_later(max(delay, 0)))
+
+    if scheduled is not None and not scheduled.done():
+        # Let an edit in progress finish, a pending one is replaced below
+        if lock.locked():
+            await scheduled
+        else:
+            scheduled.cancel()
+    await flush()
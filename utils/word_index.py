@@ -0,0 +1,57 @@
+import bisect
+import unicodedata
+from collections.abc import Iterable
+
+
+class PrefixIndex:
+    """Sorted list of words answering prefix queries with bisect
+
+    Lookups never leave the process, so they stay well within Discord's
+    autocomplete deadline with hundreds of thousands of words.
+    """
+
+    def __init__(self) -> None:
+        self._words: list[str] = []
+
+    def add(self, word: str) -> None:
+        word = unicodedata.normalize("NFC", word.strip())
+        idx = bisect.bisect_left(self._words, word)
+        if word and (idx == len(self._words) or self._words[idx] != word):
+            self._words.insert(idx, word)
+
+    def update(self, words: Iterable[str]) -> int:
+        """Add many words with one sort, returns how many were given"""
+        added = {unicodedata.normalize("NFC", word.strip()) for word in words}
+        added.discard("")
+        self._words = sorted(added.union(self._words))
+        return len(added)
+
+    def load(self, path: str) -> int:
+        """Add the words of a file with one word per line, returns the count
+
+        Blocks while reading and sorting, so run it in a worker thread.
+        """
+        with open(path, encoding="utf-8") as f:
+            return self.update(f)
+
+    def complete(self, prefix: str, limit: int = 25) -> list[str]:
+        """At most ``limit`` words starting with ``prefix``, in sorted order"""
+        prefix = unicodedata.normalize("NFC", prefix)
+        if not prefix:
+            return []
+        idx = bisect.bisect_left(self._words, prefix)
+        matches = []
+        for word in self._words[idx : idx + limit]:
+            if not word.startswith(prefix):
+                break
+            matches.append(word)
+        return matches
+
+    def __len__(self) -> int:
+        return len(self._words)
+
+
+# Words that /dict or /usage found, including those in the cache store, plus
+# the optional WORD_INDEX_PATH list. Kept out of the cogs so /reload does not
+# empty it.
+WORD_INDEX = PrefixIndex()